@@ -1,20 +1,69 @@
 from django.contrib import admin
-from .models import Profile, Task, UserTask
+from django.db import transaction
+from .models import Profile, Level, Task, UserTask, DailyStat, GlobalDailyStat, GlobalStat, OutboundEmail, AdminJob, ArchivedMonth
+from .authentication import invalidate_cached_user
+from .dashboard import bump_dashboard_version
+from .leaderboard import sync_user
+from .levels import get_levels
+from .rollups import adjust_total
 
 # Configuración para ver mejor los datos en el panel
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'points', 'level', 'co2_saved')
     search_fields = ('user__username', 'user__first_name')
 
+    def save_model(self, request, obj, form, change):
+        # Ajuste manual de puntos: se traslada la diferencia al total global, ranking y caché
+        old = Profile.objects.filter(pk=obj.pk).values('points', 'co2_saved').first() or {'points': 0, 'co2_saved': 0.0}
+        if not obj.user.is_staff: obj.level = get_levels().name(obj.points)
+        super().save_model(request, obj, form, change)
+        adjust_total(obj.points - old['points'], obj.co2_saved - old['co2_saved'])
+        transaction.on_commit(lambda: sync_user(obj.user, obj.points))
+        transaction.on_commit(lambda: invalidate_cached_user(obj.user_id))
+        transaction.on_commit(lambda: bump_dashboard_version(obj.user_id))
+
+class LevelAdmin(admin.ModelAdmin):
+    list_display = ('name', 'min_points')
+
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'points', 'description', 'icon_type')
+    list_display = ('title', 'points', 'description', 'icon_type', 'cooldown_seconds', 'daily_limit')
     list_filter = ('points', 'icon_type')
 
 class UserTaskAdmin(admin.ModelAdmin):
     list_display = ('user', 'task', 'completed_at')
     list_filter = ('completed_at',)
 
+class DailyStatAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'points', 'co2', 'tasks')
+    list_filter = ('date',)
+
+class GlobalDailyStatAdmin(admin.ModelAdmin):
+    list_display = ('date', 'points', 'co2', 'tasks')
+
+class ArchivedMonthAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'points', 'co2', 'tasks')
+    list_filter = ('month',)
+
+class GlobalStatAdmin(admin.ModelAdmin):
+    list_display = ('period', 'points', 'co2', 'tasks')
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    exclude = ('body',)  # Puede contener contraseñas temporales
+
+class AdminJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'processed', 'total', 'rows_deleted', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+
 # Registrar modelos
 admin.site.register(Profile, ProfileAdmin)
+admin.site.register(Level, LevelAdmin)
 admin.site.register(Task, TaskAdmin)
-admin.site.register(UserTask, UserTaskAdmin)
\ No newline at end of file
+admin.site.register(UserTask, UserTaskAdmin)
+admin.site.register(DailyStat, DailyStatAdmin)
+admin.site.register(GlobalDailyStat, GlobalDailyStatAdmin)
+admin.site.register(ArchivedMonth, ArchivedMonthAdmin)
+admin.site.register(GlobalStat, GlobalStatAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+admin.site.register(AdminJob, AdminJobAdmin)
\ No newline at end of file
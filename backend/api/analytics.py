@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from datetime import date, timedelta
+
+from .dashboard import get_versions, GLOBAL_VERSION_KEY, version_key
+from .models import ArchiveCheckpoint, UserTask
+from .pagination import parse_day
+from .rollups import CO2_PER_POINT, daily_totals_query, local_day_bounds
+
+GRANULARITIES = ('day', 'week', 'month')
+GROUP_BY = {'icon_type': 'task__icon_type'}
+# Como máximo un año por consulta: la respuesta queda acotada a 366 periodos (× 7 iconos si se agrupa)
+MAX_DAYS = 366
+
+
+def parse_params(params):
+    """(desde, hasta, granularidad, agrupación) de la consulta; lanza ValueError si no son válidos.
+
+    El rango es `range` días hasta hoy (30 por defecto) o las fechas locales `from`/`to` (ambas incluidas).
+    """
+    end = parse_day(params['to']) if params.get('to') else timezone.localdate()
+    if params.get('from'):
+        start = parse_day(params['from'])
+    else:
+        days = int(params.get('range', 30))
+        # Se acota antes de restar: un range enorme (o un `to` cerca del año 1) desbordaría la fecha
+        if not 1 <= days <= MAX_DAYS or end.toordinal() < days:
+            raise ValueError('Parámetros inválidos')
+        start = end - timedelta(days=days - 1)
+    granularity = params.get('granularity', 'day')
+    group_by = params.get('group_by') or None
+    # Año 9999: el último periodo (semana o mes) terminaría fuera del rango de fechas
+    if (end.year == date.max.year or not 0 <= (end - start).days < MAX_DAYS or granularity not in GRANULARITIES
+            or (group_by and group_by not in GROUP_BY)):
+        raise ValueError('Parámetros inválidos')
+    return start, end, granularity, group_by
+
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def periods(start, end, granularity):
+    """Inicio de cada periodo del rango, en orden (semanas de lunes a domingo, como TruncWeek)."""
+    day, result = period_start(start, granularity), []
+    while day <= end:
+        result.append(day)
+        if granularity == 'month':
+            day = (day + timedelta(days=32)).replace(day=1)
+        else:
+            day += timedelta(days=7 if granularity == 'week' else 1)
+    return result
+
+
+def grouped_rows(start, end, granularity, group_by, user_id=None):
+    """Una sola consulta agrupada en la BD: filas {period, [grupo], points, co2, tasks}."""
+    if group_by is None:
+        # Sin desglose alcanza con los rollups diarios: como mucho 366 filas, no la tabla de completaciones
+        qs = daily_totals_query(start, end, user_id)
+        return (qs.annotate(period=Trunc('date', granularity, output_field=DateField()))
+                .values('period').annotate(points=Sum('points'), co2=Sum('co2'), tasks=Sum('tasks')).order_by())
+    # Los rollups no guardan el tipo de tarea: rango de completed_at sobre su índice, agrupado en la BD
+    since, until = local_day_bounds(start, end)
+    qs = UserTask.objects.filter(completed_at__gte=since, completed_at__lt=until)
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    rows = (qs.annotate(period=Trunc('completed_at', granularity, output_field=DateField()))
+            .values('period', GROUP_BY[group_by]).annotate(points=Sum('task__points'), tasks=Count('id')).order_by())
+    return [{'period': r['period'], 'group': r[GROUP_BY[group_by]], 'points': r['points'],
+             'co2': r['points'] * CO2_PER_POINT, 'tasks': r['tasks']} for r in rows]
+
+
+def grouped_start(start, end):
+    """Primer día con desglose: lo archivado (ArchivedMonth) no guarda el tipo de tarea, así que el desglose empieza
+    en el horizonte del archivo. Devuelve (inicio, horizonte si recortó); ValueError si todo el rango está archivado."""
+    horizon = ArchiveCheckpoint.objects.values_list('horizon', flat=True).first()
+    if not horizon or start >= horizon:
+        return start, None
+    if horizon > end:
+        raise ValueError('Rango archivado')
+    return horizon, horizon
+
+
+def compute_analytics(start, end, granularity, group_by, user_id=None):
+    archived_before = None
+    if group_by:
+        start, archived_before = grouped_start(start, end)
+    buckets = {p: {'period': p.isoformat(), 'points': 0, 'co2': 0.0, 'tasks': 0} for p in periods(start, end, granularity)}
+    if group_by:
+        for bucket in buckets.values():
+            bucket['groups'] = {}
+    for row in grouped_rows(start, end, granularity, group_by, user_id):
+        bucket = buckets[row['period']]
+        bucket['points'] += row['points']; bucket['co2'] += row['co2']; bucket['tasks'] += row['tasks']
+        if group_by:
+            bucket['groups'][row['group']] = {'points': row['points'], 'co2': round(row['co2'], 2), 'tasks': row['tasks']}
+    for bucket in buckets.values():
+        bucket['co2'] = round(bucket['co2'], 2)
+    return {'from': start.isoformat(), 'to': end.isoformat(), 'granularity': granularity, 'group_by': group_by,
+            'archived_before': archived_before and archived_before.isoformat(), 'series': list(buckets.values())}
+
+
+def get_analytics(params, user_id=None):
+    """Serie temporal (global o de un usuario) cacheada por parámetros; ValueError si no son válidos."""
+    start, end, granularity, group_by = parse_params(params)
+    # Versiones del dashboard: las completaciones del usuario y los cambios de tareas invalidan la entrada.
+    # Las globales no tienen versión por completación: caducan a los ANALYTICS_CACHE_TIMEOUT segundos.
+    if user_id:
+        versions = get_versions(user_id)
+        scope = f'{user_id}:{versions[version_key(user_id)]}:{versions[GLOBAL_VERSION_KEY]}'
+    else:
+        scope = f'all:{cache.get(GLOBAL_VERSION_KEY)}'
+    key = (f'analytics:{scope}:{timezone.localdate():%Y%m%d}:'
+           f'{start:%Y%m%d}:{end:%Y%m%d}:{granularity}:{group_by}')
+    data = cache.get(key)
+    if data is None:
+        data = compute_analytics(start, end, granularity, group_by, user_id)
+        cache.set(key, data, getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 300))
+    return data
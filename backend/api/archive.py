@@ -0,0 +1,84 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from pathlib import Path
+import gzip
+import json
+
+from .models import ArchiveCheckpoint, ArchivedMonth, ArchivedUserTask, UserTask
+from .rollups import CO2_PER_POINT, local_day_bounds
+
+
+def advance_horizon(cutoff):
+    """Se fija antes de mover filas: si el proceso se corta, los días a medio archivar ya quedan protegidos."""
+    checkpoint = ArchiveCheckpoint.objects.select_for_update().first()
+    if checkpoint is None:
+        ArchiveCheckpoint.objects.create(horizon=cutoff)
+    elif checkpoint.horizon < cutoff:
+        checkpoint.horizon = cutoff
+        checkpoint.save(update_fields=['horizon', 'updated_at'])
+
+
+def month_of(completed_at):
+    return timezone.localtime(completed_at).date().replace(day=1)
+
+
+def add_to_months(rows):
+    """Suma un lote de completaciones a ArchivedMonth: una lectura, un bulk_update y un bulk_create."""
+    deltas = {}
+    for r in rows:
+        total = deltas.setdefault((r['user_id'], month_of(r['completed_at'])), [0, 0])
+        total[0] += r['task__points']; total[1] += 1
+    users, months = {u for u, _ in deltas}, {m for _, m in deltas}
+    existing = {(s.user_id, s.month): s for s in
+                ArchivedMonth.objects.select_for_update().filter(user_id__in=users, month__in=months)}
+    changed, created = [], []
+    for key, (points, tasks) in deltas.items():
+        summary = existing.get(key)
+        if summary is None:
+            created.append(ArchivedMonth(user_id=key[0], month=key[1], points=points, co2=points * CO2_PER_POINT, tasks=tasks))
+        else:
+            summary.points += points; summary.co2 += points * CO2_PER_POINT; summary.tasks += tasks
+            changed.append(summary)
+    ArchivedMonth.objects.bulk_update(changed, ['points', 'co2', 'tasks'])
+    ArchivedMonth.objects.bulk_create(created)
+
+
+def write_ndjson(directory, rows):
+    """Escribe el lote en <dir>/usertask-<primer id>.ndjson.gz. Un reintento del mismo lote sobrescribe el archivo."""
+    path = Path(directory) / f"usertask-{rows[0]['id']:012d}.ndjson.gz"
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for r in rows:
+            f.write(json.dumps({'id': r['id'], 'user_id': r['user_id'], 'task_id': r['task_id'], 'points': r['task__points'],
+                                'completed_at': r['completed_at'], 'idempotency_key': r['idempotency_key']},
+                               cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+    return path
+
+
+def archive_batch(cutoff, batch_size=5000, directory=None):
+    """Archiva las completaciones más antiguas (anteriores a la fecha local cutoff). Devuelve las filas movidas.
+
+    Cada lote es una transacción: resumen mensual + copia (tabla o NDJSON) + borrado. Si se corta, el lote
+    vuelve a empezar desde la fila más antigua que quede, así que el comando se puede relanzar sin más.
+    Los perfiles, rollups diarios y GlobalStat no se tocan: los totales no cambian.
+    """
+    before = local_day_bounds(cutoff, cutoff)[0]
+    with transaction.atomic():
+        # Índice de completed_at: solo se leen las filas del lote
+        rows = list(UserTask.objects.select_for_update(of=('self',)).filter(completed_at__lt=before).order_by('completed_at', 'id')
+                    .values('id', 'user_id', 'task_id', 'task__points', 'completed_at', 'idempotency_key')[:batch_size])
+        if not rows:
+            return 0
+        add_to_months(rows)
+        if directory:
+            write_ndjson(directory, rows)
+        else:
+            ArchivedUserTask.objects.bulk_create([
+                ArchivedUserTask(id=r['id'], user_id=r['user_id'], task_id=r['task_id'], points=r['task__points'],
+                                 completed_at=r['completed_at'], idempotency_key=r['idempotency_key'])
+                for r in rows
+            ])
+        UserTask.objects.filter(id__in=[r['id'] for r in rows]).delete()
+        ArchiveCheckpoint.objects.update(rows=F('rows') + len(rows))
+    return len(rows)
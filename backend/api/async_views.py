@@ -0,0 +1,98 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from functools import wraps
+
+from .authentication import CachedJWTAuthentication
+from .catalog import acatalog_version, aget_catalog, catalog_etag
+from .dashboard import aget_dashboard
+from .leaderboard import get_leaderboard
+from .levels import aget_levels
+from .models import Profile
+from .renderers import FastJSONRenderer
+from .rollups import adaily_totals
+from .views import weekly_window, format_weekly_chart, dashboard_payload, history_query, history_page
+
+# Versiones async (ASGI) de los endpoints de lectura más usados. Se activan en core/urls.py con
+# ASYNC_API=1 y responden el mismo JSON que las vistas DRF equivalentes de views.py.
+
+jwt_auth = CachedJWTAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    # Mismo renderer que las vistas DRF (orjson con FAST_JSON=1): mismos bytes que la respuesta síncrona
+    content = (FastJSONRenderer if settings.FAST_JSON else JSONRenderer)().render(data)
+    return HttpResponse(content, status=status, headers=headers, content_type='application/json')
+
+
+def async_jwt_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await jwt_auth.aauthenticate(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            return json_response(e.detail, status=401)
+        if user is None:
+            return json_response({'detail': str(NotAuthenticated.default_detail)}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+async def get_ranking(request):
+    # El ranking vive en memoria/Redis; solo una recarga puntual toca la BD
+    top = await sync_to_async(get_leaderboard().top)(0, 10)
+    return json_response([{"name": e["name"], "points": e["points"]} for e in top])
+
+
+@require_GET
+@async_jwt_required
+async def get_tasks(request):
+    version = await acatalog_version()
+    etag = catalog_etag(version)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304, headers=headers)
+    return json_response(await aget_catalog(version), headers=headers)
+
+
+async def build_dashboard(user):
+    """Equivalente async de views.build_dashboard (mismo contenido en caché)."""
+    profile = await Profile.objects.filter(user_id=user.id).afirst()
+    history, limit = history_query(user, {})
+    rows = [row async for row in history[:limit + 1].aiterator()]
+    dashboard = None
+    if profile:
+        last_7_days = weekly_window()
+        totals = await adaily_totals(last_7_days[0], last_7_days[-1], user_id=user.id)
+        levels = await aget_levels()
+        dashboard = dashboard_payload(profile, format_weekly_chart(last_7_days, totals), levels)
+    return {"dashboard": dashboard, "history": history_page(rows, limit)}
+
+
+@require_GET
+@async_jwt_required
+async def get_dashboard_data(request):
+    data = (await aget_dashboard(request.user, build_dashboard))['dashboard']
+    if data is None:
+        return json_response({"points": 0, "weekly_data": []}, status=400)
+    return json_response(data)
+
+
+@require_GET
+@async_jwt_required
+async def get_user_history(request):
+    if request.GET:
+        try:
+            history, limit = history_query(request.user, request.GET)
+        except ValueError:
+            return json_response({'error': 'Parámetros inválidos'}, status=400)
+        data, next_cursor = history_page([row async for row in history[:limit + 1].aiterator()], limit)
+    else:
+        data, next_cursor = (await aget_dashboard(request.user, build_dashboard))['history']
+    return json_response(data, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
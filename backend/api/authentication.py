@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+import copy
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """Llamar tras cualquier cambio del usuario o su perfil (puntos, estado, contraseña, nombre)."""
+    cache.delete(user_cache_key(user_id))
+
+
+def invalidate_cached_users(user_ids):
+    """invalidate_cached_user para muchos usuarios en una sola operación de caché (acciones masivas)."""
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def cacheable_user(user):
+    """Copia de User+Profile para la caché (compartida con Redis) sin el hash de la contraseña.
+
+    password queda diferido: si algo llega a leerlo se relee de la BD, y un save() no lo sobrescribe.
+    Con CHECK_REVOKE_TOKEN se guarda solo su resumen MD5, que es lo que compara check_user.
+    """
+    cached = copy.copy(user)
+    if api_settings.CHECK_REVOKE_TOKEN:
+        cached.password_digest = get_md5_hash_password(user.password)
+    del cached.__dict__['password']
+    profile = user._state.fields_cache.get('profile')
+    if profile is not None:
+        # El perfil apunta de vuelta al User original (con el hash): se cachea apuntando a la copia
+        profile = copy.copy(profile)
+        profile._state.fields_cache['user'] = cached
+        cached._state.fields_cache['profile'] = profile
+    return cached
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que carga User + Profile en una sola consulta y la guarda brevemente en caché.
+
+    La entrada es por usuario (no por token) para poder invalidarla con una sola clave; todos los
+    tokens vigentes del mismo usuario comparten la copia cacheada.
+    """
+
+    def get_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = (self.user_model.objects.select_related('profile')
+                        .get(**{api_settings.USER_ID_FIELD: user_id}))
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(key, cacheable_user(user), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 30))
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """Equivalente async de authenticate() para las vistas ASGI (no son vistas DRF)."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await (self.user_model.objects.select_related('profile')
+                              .aget(**{api_settings.USER_ID_FIELD: user_id}))
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            await cache.aset(key, cacheable_user(user), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 30))
+        return self.check_user(user, validated_token)
+
+    def token_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            digest = getattr(user, 'password_digest', None) or get_md5_hash_password(user.password)
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
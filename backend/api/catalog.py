@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.cache import cache
+import time
+
+from .models import Task
+from .serializers import TASK_FIELDS
+
+VERSION_KEY = 'tasks:catalog:version'
+
+
+def catalog_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def catalog_version():
+    """Versión actual del catálogo; si no existe (o expiró) se crea una nueva."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), catalog_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), catalog_timeout())
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs):
+    """Receptor de post_save/post_delete de Task: invalida el catálogo cacheado."""
+    # La versión también expira: con caché local por worker acota cuánto dura una copia vieja
+    cache.set(VERSION_KEY, time.time_ns(), catalog_timeout())
+
+
+def catalog_etag(version):
+    return f'"tasks-{version}"'
+
+
+def get_catalog(version):
+    """Lista serializada de tareas para una versión, calculada solo en caso de fallo de caché."""
+    key = f'tasks:catalog:{version}'
+    data = cache.get(key)
+    if data is None:
+        # .values() en vez de TaskSerializer: mismo JSON sin crear modelos ni serializar campo a campo
+        data = list(Task.objects.values(*TASK_FIELDS))
+        cache.set(key, data, catalog_timeout())
+    return data
+
+
+def catalog_index():
+    """{id: fila} del catálogo cacheado, para consultar una tarea (p. ej. sus límites) sin ir a la BD."""
+    return {t['id']: t for t in get_catalog(catalog_version())}
+
+
+async def aget_catalog(version):
+    key = f'tasks:catalog:{version}'
+    data = await cache.aget(key)
+    if data is None:
+        data = [t async for t in Task.objects.values(*TASK_FIELDS)]
+        await cache.aset(key, data, catalog_timeout())
+    return data
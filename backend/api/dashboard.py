@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+import time as clock
+
+# Versión global: invalida los dashboards de todos (cambios de niveles o del catálogo de tareas)
+GLOBAL_VERSION_KEY = 'dashboard:version'
+
+
+def version_key(user_id):
+    return f'dashboard:{user_id}:version'
+
+
+def bump_dashboard_version(user_id=None):
+    """Invalida el dashboard cacheado de un usuario (o el de todos con user_id=None)."""
+    cache.set(version_key(user_id) if user_id else GLOBAL_VERSION_KEY, clock.time_ns(), None)
+
+
+def bump_dashboard_versions(user_ids):
+    """bump_dashboard_version para muchos usuarios en una sola operación de caché."""
+    version = clock.time_ns()
+    cache.set_many({version_key(user_id): version for user_id in user_ids}, None)
+
+
+def tasks_changed(**kwargs):
+    """Receptor de post_save/post_delete de Task: el historial cacheado muestra títulos y puntos."""
+    bump_dashboard_version()
+
+
+def dashboard_timeout():
+    """Hasta la medianoche local (la ventana semanal cambia de día), con DASHBOARD_CACHE_TIMEOUT como máximo."""
+    now = timezone.localtime()
+    midnight = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), time.min))
+    return max(1, min(getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 30), int((midnight - now).total_seconds())))
+
+
+def dashboard_key(user_id, versions):
+    return f'dashboard:{user_id}:{versions[version_key(user_id)]}:{versions[GLOBAL_VERSION_KEY]}:{timezone.localdate():%Y%m%d}'
+
+
+def get_versions(user_id):
+    keys = [version_key(user_id), GLOBAL_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, clock.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+async def aget_versions(user_id):
+    keys = [version_key(user_id), GLOBAL_VERSION_KEY]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, clock.time_ns(), None)
+            versions[key] = await cache.aget(key)
+    return versions
+
+
+def get_dashboard(user, build):
+    """Dashboard + primera página del historial del usuario (cache-aside); build(user) solo en caso de fallo."""
+    # La versión se lee antes de calcular: si una completación la cambia entretanto, lo calculado queda huérfano
+    key = dashboard_key(user.id, get_versions(user.id))
+    data = cache.get(key)
+    if data is None:
+        data = build(user)
+        cache.set(key, data, dashboard_timeout())
+    return data
+
+
+async def aget_dashboard(user, build):
+    key = dashboard_key(user.id, await aget_versions(user.id))
+    data = await cache.aget(key)
+    if data is None:
+        data = await build(user)
+        await cache.aset(key, data, dashboard_timeout())
+    return data
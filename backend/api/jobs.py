@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+
+from .authentication import invalidate_cached_users
+from .dashboard import bump_dashboard_versions
+from .leaderboard import get_leaderboard
+from .models import AdminJob, ArchivedUserTask, DailyStat, Profile, UserTask
+from .rollups import discount_user
+
+# Un trabajo 'running' sin latido durante este tiempo se considera abandonado y otro worker lo retoma
+STALE_AFTER = timedelta(minutes=10)
+
+
+def queue_delete_users(user_ids, requested_by=None):
+    """Encola el borrado de usuarios (nunca superusuarios ni quien lo pide); lo ejecuta run_job_worker."""
+    ids = list(User.objects.filter(id__in=user_ids, is_superuser=False)
+               .exclude(id=getattr(requested_by, 'id', None)).order_by('id').values_list('id', flat=True))
+    return AdminJob.objects.create(kind='delete_users', payload={'user_ids': ids}, total=len(ids), requested_by=requested_by)
+
+
+def raw_delete(model, where, params, limit=None):
+    """DELETE directo en SQL (sin el collector de Django: no carga filas ni envía señales). Devuelve filas borradas."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = f'DELETE FROM {table} WHERE {where}'
+    if limit:
+        # Por lotes: cada DELETE es corto y no retiene bloqueos sobre la tabla caliente
+        sql = f'DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {where} LIMIT %s)'
+        params = [*params, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def delete_users_chunk(user_ids, batch_size=5000):
+    """Borra un grupo de usuarios con sus completaciones. Devuelve las filas borradas.
+
+    Es idempotente: si el worker muere a mitad de camino, repetir el grupo no descuenta dos veces.
+    """
+    marks = ', '.join(['%s'] * len(user_ids))
+    with transaction.atomic():
+        # 1. Suspender y descontar de los rollups globales. El perfil queda en cero, así que un reintento no resta nada
+        #    y el total histórico sigue siendo la suma de los perfiles mientras se borra el historial.
+        User.objects.filter(id__in=user_ids).update(is_active=False)
+        for user_id in user_ids:
+            discount_user(user_id)
+        Profile.objects.filter(user_id__in=user_ids).update(points=0, co2_saved=0.0)
+        deleted = raw_delete(DailyStat, f'user_id IN ({marks})', user_ids)
+        transaction.on_commit(lambda: invalidate_cached_users(user_ids))
+    # 2. El historial (la parte pesada, también el archivado) en lotes, cada uno en su propia transacción corta
+    for model in (UserTask, ArchivedUserTask):
+        while True:
+            with transaction.atomic():
+                rows = raw_delete(model, f'user_id IN ({marks})', user_ids, limit=batch_size)
+            deleted += rows
+            if rows < batch_size:
+                break
+    # 3. Perfil en SQL; el collector de Django solo recorre ya las relaciones livianas (grupos, permisos, log)
+    with transaction.atomic():
+        deleted += raw_delete(Profile, f'user_id IN ({marks})', user_ids)
+        deleted += User.objects.filter(id__in=user_ids).delete()[0]
+    board = get_leaderboard()
+    for user_id in user_ids:
+        board.remove(user_id)
+    bump_dashboard_versions(user_ids)
+    return deleted
+
+
+def claim_job():
+    """Toma el trabajo pendiente más antiguo (o uno abandonado); None si no hay."""
+    with transaction.atomic():
+        stale = timezone.now() - STALE_AFTER
+        job = (AdminJob.objects.select_for_update(skip_locked=True)
+               .filter(Q(status='pending') | Q(status='running', updated_at__lt=stale))
+               .order_by('created_at').first())
+        if job:
+            job.status = 'running'
+            job.save(update_fields=['status', 'updated_at'])
+        return job
+
+
+def run_job(job, chunk_size=50, batch_size=5000):
+    """Ejecuta un trabajo desde donde quedó (processed), guardando el progreso tras cada grupo."""
+    try:
+        if job.kind != 'delete_users':
+            raise ValueError(f'Tipo de trabajo desconocido: {job.kind}')
+        user_ids = job.payload['user_ids']
+        while job.processed < len(user_ids):
+            chunk = user_ids[job.processed:job.processed + chunk_size]
+            job.rows_deleted += delete_users_chunk(chunk, batch_size)
+            job.processed += len(chunk)
+            job.save(update_fields=['processed', 'rows_deleted', 'updated_at'])
+        job.status = 'done'
+    except Exception as e:
+        job.status, job.last_error = 'failed', str(e)[:1000]
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+    return job
+
+
+def job_payload(job):
+    return {"id": job.id, "kind": job.kind, "status": job.status, "total": job.total, "processed": job.processed,
+            "rows_deleted": job.rows_deleted, "error": job.last_error or None,
+            "created_at": job.created_at, "finished_at": job.finished_at}
@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from bisect import bisect_left, insort
+from functools import lru_cache
+import threading
+import time
+
+from .models import Profile
+
+
+def ranked_profiles():
+    """Perfiles que participan del ranking (se excluye staff y superusuarios)."""
+    return Profile.objects.filter(user__is_superuser=False, user__is_staff=False)
+
+
+def load_rows():
+    return ranked_profiles().order_by('-points', 'user_id').values_list('user_id', 'user__first_name', 'points')
+
+
+class InMemoryLeaderboard:
+    """Ranking en memoria del proceso: lista ordenada por (-puntos, user_id) con búsqueda bisect.
+
+    Cada worker de gunicorn tiene su propia copia, por eso se recarga desde la BD cada
+    LEADERBOARD_REFRESH_SECONDS para recoger los cambios hechos en otros procesos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._scores = {}
+        self._names = {}
+        self._loaded_at = None
+        self.max_age = getattr(settings, 'LEADERBOARD_REFRESH_SECONDS', 60)
+
+    def load(self, rows):
+        entries, scores, names = [], {}, {}
+        for user_id, name, points in rows:
+            entries.append((-points, user_id))
+            scores[user_id] = points
+            names[user_id] = name
+        entries.sort()
+        with self._lock:
+            self._entries, self._scores, self._names = entries, scores, names
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.load(load_rows())
+
+    def update(self, user_id, name, points):
+        with self._lock:
+            if self._loaded_at is None:
+                return  # La primera lectura cargará el valor desde la BD
+            old = self._scores.get(user_id)
+            if old is not None:
+                del self._entries[bisect_left(self._entries, (-old, user_id))]
+            insort(self._entries, (-points, user_id))
+            self._scores[user_id] = points
+            self._names[user_id] = name
+
+    def remove(self, user_id):
+        with self._lock:
+            old = self._scores.pop(user_id, None)
+            if old is not None:
+                del self._entries[bisect_left(self._entries, (-old, user_id))]
+                self._names.pop(user_id, None)
+
+    def rank(self, user_id):
+        self._ensure_fresh()
+        with self._lock:
+            points = self._scores.get(user_id)
+            if points is None:
+                return None
+            return bisect_left(self._entries, (-points, user_id)) + 1
+
+    def top(self, offset=0, limit=10):
+        self._ensure_fresh()
+        with self._lock:
+            page = self._entries[offset:offset + limit]
+            return [{"rank": offset + i + 1, "user_id": uid, "name": self._names.get(uid, ''), "points": -neg}
+                    for i, (neg, uid) in enumerate(page)]
+
+    def count(self):
+        self._ensure_fresh()
+        return len(self._entries)
+
+
+# Puntaje en el sorted set: puntos * ID_SPAN + (ID_SPAN - 1 - user_id). Con ZREVRANGE los empates quedan por
+# user_id ascendente, igual que InMemoryLeaderboard. Exacto en un double hasta 2**26 puntos y 2**27 usuarios.
+ID_SPAN = 2 ** 27
+
+
+def encode_score(user_id, points):
+    return points * ID_SPAN + (ID_SPAN - 1 - user_id)
+
+
+def decode_points(score):
+    return int(score) // ID_SPAN
+
+
+class RedisLeaderboard:
+    """Ranking en un sorted set compatible con Redis (ZADD/ZREVRANK/ZREVRANGE), compartido entre workers.
+
+    Las escrituras van directo al sorted set; además, un solo worker por periodo de LEADERBOARD_REFRESH_SECONDS
+    (el que crea la marca con SET NX EX) lo recarga desde la BD para reconciliar lo que se haya perdido.
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(settings.LEADERBOARD_REDIS_URL, decode_responses=True)
+        self.client = client
+        self.key = getattr(settings, 'LEADERBOARD_REDIS_KEY', 'ecopoints:leaderboard')
+        self.names_key = f'{self.key}:names'
+        self.fresh_key = f'{self.key}:fresh'
+        self.max_age = getattr(settings, 'LEADERBOARD_REFRESH_SECONDS', 60)
+
+    def load(self, rows):
+        rows = list(rows)
+        if not rows:
+            self.client.delete(self.key, self.names_key)
+            return
+        # Se carga en claves temporales y RENAME las reemplaza de forma atómica: nunca se lee un ranking a medias
+        loading, names_loading = f'{self.key}:loading', f'{self.names_key}:loading'
+        self.client.delete(loading, names_loading)
+        self.client.zadd(loading, {str(uid): encode_score(uid, points) for uid, _, points in rows})
+        self.client.hset(names_loading, mapping={str(uid): name for uid, name, _ in rows})
+        self.client.rename(loading, self.key)
+        self.client.rename(names_loading, self.names_key)
+
+    def _ensure_fresh(self):
+        # La marca expira cada max_age segundos; un ranking vacío también cuenta como cargado
+        if self.client.set(self.fresh_key, 1, nx=True, ex=self.max_age):
+            self.load(load_rows())
+
+    def update(self, user_id, name, points):
+        self._ensure_fresh()
+        self.client.zadd(self.key, {str(user_id): encode_score(user_id, points)})
+        self.client.hset(self.names_key, str(user_id), name)
+
+    def remove(self, user_id):
+        self.client.zrem(self.key, str(user_id))
+        self.client.hdel(self.names_key, str(user_id))
+
+    def rank(self, user_id):
+        self._ensure_fresh()
+        rank = self.client.zrevrank(self.key, str(user_id))
+        return None if rank is None else rank + 1
+
+    def top(self, offset=0, limit=10):
+        self._ensure_fresh()
+        page = self.client.zrevrange(self.key, offset, offset + limit - 1, withscores=True)
+        names = self.client.hmget(self.names_key, [m for m, _ in page]) if page else []
+        return [{"rank": offset + i + 1, "user_id": int(m), "name": names[i] or '', "points": decode_points(score)}
+                for i, (m, score) in enumerate(page)]
+
+    def count(self):
+        self._ensure_fresh()
+        return self.client.zcard(self.key)
+
+
+@lru_cache(maxsize=None)
+def get_leaderboard():
+    """Backend configurado en LEADERBOARD_BACKEND (uno por proceso)."""
+    return import_string(settings.LEADERBOARD_BACKEND)()
+
+
+def sync_user(user, points):
+    """Write-through tras acreditar puntos o cambiar el nombre."""
+    if user.is_staff or user.is_superuser:
+        return
+    get_leaderboard().update(user.id, user.first_name, points)
+
+
+def resync_user(user_id):
+    """Vuelve a leer al usuario desde la BD: entra al ranking, o sale si ya no participa (staff o borrado)."""
+    row = ranked_profiles().filter(user_id=user_id).values_list('user_id', 'user__first_name', 'points').first()
+    if row:
+        get_leaderboard().update(*row)
+    else:
+        get_leaderboard().remove(user_id)
+
+
+def profile_saved(sender, instance, created, **kwargs):
+    # Alta: el usuario aparece en el ranking con 0 puntos desde el registro
+    if created:
+        transaction.on_commit(lambda: resync_user(instance.user_id))
+
+
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Cambios de staff/superusuario (p. ej. desde el admin de Django); el login solo guarda last_login
+    if not created and not (update_fields and set(update_fields) <= {'last_login'}):
+        transaction.on_commit(lambda: resync_user(instance.id))
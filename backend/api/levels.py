@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Max, Value, When
+from bisect import bisect_right
+import threading
+import time
+
+from .dashboard import bump_dashboard_version
+from .models import Level, Profile
+from .leaderboard import ranked_profiles
+
+DEFAULT_LEVEL = Profile._meta.get_field('level').default
+
+
+class LevelTable:
+    """Umbrales de nivel ordenados por puntos mínimos: nivel y progreso con bisect, sin consultar la BD."""
+
+    def __init__(self, rows):
+        rows = sorted(rows)
+        self.thresholds = [points for points, _ in rows]
+        self.names = [name for _, name in rows]
+
+    def index(self, points):
+        return bisect_right(self.thresholds, points) - 1
+
+    def name(self, points):
+        i = self.index(points)
+        return self.names[i] if i >= 0 else DEFAULT_LEVEL
+
+    def progress(self, points):
+        """Porcentaje de avance hacia el siguiente nivel (100 en el último)."""
+        i = self.index(points)
+        if i + 1 >= len(self.thresholds):
+            return 100
+        start = self.thresholds[i] if i >= 0 else 0
+        return min(100, int((points - start) * 100 / (self.thresholds[i + 1] - start)))
+
+    def crossed(self, old_points, new_points):
+        return self.index(old_points) != self.index(new_points)
+
+    def case(self):
+        """Equivalente SQL de name(): permite recalcular niveles con un solo UPDATE."""
+        whens = [When(points__gte=t, then=Value(n)) for t, n in zip(reversed(self.thresholds), reversed(self.names))]
+        return Case(*whens, default=Value(DEFAULT_LEVEL))
+
+
+# Copia por proceso; se recarga cada LEVELS_REFRESH_SECONDS para recoger cambios hechos en otros workers
+_lock = threading.Lock()
+_table = None
+_loaded_at = 0.0
+
+
+def levels_stale():
+    return _table is None or time.monotonic() - _loaded_at > getattr(settings, 'LEVELS_REFRESH_SECONDS', 300)
+
+
+def store_levels(rows):
+    global _table, _loaded_at
+    table = LevelTable(rows)
+    with _lock:
+        _table, _loaded_at = table, time.monotonic()
+    return table
+
+
+def get_levels():
+    if levels_stale():
+        return store_levels(Level.objects.values_list('min_points', 'name'))
+    return _table
+
+
+async def aget_levels():
+    """get_levels para las vistas ASGI: la recarga usa el ORM async (el sync lanzaría SynchronousOnlyOperation)."""
+    if levels_stale():
+        return store_levels([row async for row in Level.objects.values_list('min_points', 'name')])
+    return _table
+
+
+def reset_levels():
+    global _table
+    with _lock:
+        _table = None
+
+
+def sync_level(profile, earned):
+    """Tras sumar `earned` puntos (profile ya refrescado) cambia el nivel solo si se cruzó un umbral."""
+    table = get_levels()
+    if profile.user.is_staff or not table.crossed(profile.points - earned, profile.points):
+        return False
+    profile.level = table.name(profile.points)
+    Profile.objects.filter(pk=profile.pk).update(level=profile.level)
+    return True
+
+
+def recompute_levels(batch_size=10_000):
+    """Recalcula el nivel de todos los perfiles con UPDATEs por rangos de id; solo escribe los que cambian."""
+    case = get_levels().case()
+    last_id = Profile.objects.aggregate(last=Max('id'))['last'] or 0
+    changed = 0
+    for start in range(0, last_id + 1, batch_size):
+        with transaction.atomic():
+            changed += (ranked_profiles().filter(id__gte=start, id__lt=start + batch_size)
+                        .exclude(level=case).update(level=case))
+    if changed:
+        bump_dashboard_version()
+    return changed
+
+
+def levels_changed(**kwargs):
+    """Signal de Level: se descarta la tabla en memoria y se recalculan los perfiles al confirmar."""
+    reset_levels()
+    transaction.on_commit(recompute_levels)
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from collections import deque
+from functools import lru_cache
+import threading
+import time
+
+# Ventana del tope diario: 24 horas móviles desde cada completación (no se reinicia a medianoche)
+DAY = 86400
+
+
+class CacheSlidingWindow:
+    """Contador de ventana deslizante en la caché de Django (compartido entre workers con Redis).
+
+    Aproxima la ventana con dos cubetas fijas: la anterior pondera según cuánto de ella sigue dentro.
+    Se incrementa primero y se deshace si excede, así dos peticiones simultáneas no pasan ambas.
+    """
+
+    def allow(self, key, limit, window, amount=1):
+        if limit == 1 and amount == 1:
+            # Enfriamiento: una sola completación por ventana es una marca con expiración exacta
+            return cache.add(f'limit:{key}', 1, window)
+        now = time.time()
+        bucket, elapsed = divmod(now, window)
+        current, previous = f'limit:{key}:{int(bucket)}', f'limit:{key}:{int(bucket) - 1}'
+        cache.add(current, 0, window * 2)
+        try:
+            count = cache.incr(current, amount)
+        except ValueError:
+            # La cubeta expiró o fue desalojada entre add e incr: se cuenta como una cubeta nueva
+            count = amount if cache.add(current, amount, window * 2) else cache.incr(current, amount)
+        weight = 1 - elapsed / window
+        if (cache.get(previous) or 0) * weight + count > limit:
+            self.release(key, limit, window, amount)
+            return False
+        return True
+
+    def release(self, key, limit, window, amount=1):
+        """Devuelve lo registrado por un allow() exitoso (la completación no llegó a escribirse)."""
+        if limit == 1 and amount == 1:
+            cache.delete(f'limit:{key}')
+            return
+        try:
+            cache.decr(f'limit:{key}:{int(time.time() // window)}', amount)
+        except ValueError:
+            pass  # La cubeta ya no existe: no queda nada que devolver
+
+
+class InMemorySlidingWindow:
+    """Ventana deslizante exacta en memoria del proceso (marcas de tiempo por clave).
+
+    Cada worker cuenta por separado: sirve con un solo proceso o como primera barrera barata.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._calls = 0
+        self._max_window = 0
+
+    def allow(self, key, limit, window, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) + amount > limit:
+                return False
+            hits.extend([now] * amount)
+            self._max_window = max(self._max_window, window)
+            self._calls += 1
+            if self._calls % 10_000 == 0:
+                self._sweep(now)
+            return True
+
+    def release(self, key, limit, window, amount=1):
+        """Devuelve lo registrado por un allow() exitoso (la completación no llegó a escribirse)."""
+        with self._lock:
+            hits = self._hits.get(key)
+            for _ in range(min(amount, len(hits or ()))):
+                hits.pop()
+
+    def _sweep(self, now):
+        # Las claves de usuarios inactivos se descartan cuando su última marca ya no cuenta en ninguna ventana
+        self._hits = {k: v for k, v in self._hits.items() if v and v[-1] > now - self._max_window}
+
+
+@lru_cache(maxsize=None)
+def get_limiter():
+    """Backend configurado en COMPLETION_LIMITER_BACKEND (uno por proceso)."""
+    return import_string(settings.COMPLETION_LIMITER_BACKEND)()
+
+
+def windows(user_id, task):
+    """(clave, límite, ventana) de cada límite configurado en la tarea."""
+    if task['cooldown_seconds']:
+        yield f"cd:{user_id}:{task['id']}", 1, task['cooldown_seconds']
+    if task['daily_limit']:
+        yield f"day:{user_id}:{task['id']}", task['daily_limit'], DAY
+
+
+def check_completion(user_id, task, quantity=1):
+    """Registra la completación en las ventanas de la tarea; devuelve un mensaje de error si excede alguna.
+
+    task es la fila del catálogo cacheado (dict): se decide sin tocar la BD. Si no devuelve error y al final
+    no se escribe la completación, hay que llamar a release_completion para no gastar el cupo.
+    """
+    if not getattr(settings, 'COMPLETION_LIMITS_ENABLED', True):
+        return None
+    limiter, taken = get_limiter(), []
+    for key, limit, window in windows(user_id, task):
+        if not limiter.allow(key, limit, window, quantity):
+            for args in taken:
+                limiter.release(*args, quantity)
+            if key.startswith('cd:'):
+                return f"Debes esperar {task['cooldown_seconds']} segundos para volver a registrar esta tarea"
+            return f"Alcanzaste el límite diario de {task['daily_limit']} para esta tarea"
+        taken.append((key, limit, window))
+    return None
+
+
+def release_completion(user_id, task, quantity=1):
+    """Devuelve el cupo tomado por check_completion cuando la completación no se escribió (404, reintento...)."""
+    if not getattr(settings, 'COMPLETION_LIMITS_ENABLED', True):
+        return
+    limiter = get_limiter()
+    for key, limit, window in windows(user_id, task):
+        limiter.release(key, limit, window, quantity)
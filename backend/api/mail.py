@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import time
+
+from .models import OutboundEmail
+
+
+def queue_email(subject, message, recipient_list):
+    """Encola un correo; se envía desde run_mail_worker (dentro de la transacción de quien llama)."""
+    return OutboundEmail.objects.create(subject=subject, body=message, recipients=list(recipient_list))
+
+
+def backoff(attempts, base=30, cap=3600):
+    """Espera exponencial entre reintentos: 30s, 60s, 120s... hasta 1 hora."""
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def lease_for(batch_size, interval):
+    """Tiempo reservado para enviar un lote completo (peor caso: cada envío agota EMAIL_TIMEOUT)."""
+    return timedelta(seconds=batch_size * ((getattr(settings, 'EMAIL_TIMEOUT', None) or 30) + interval) + 60)
+
+
+def claim_batch(batch_size, lease):
+    """Reserva un lote en una transacción corta: next_attempt_at pasa al final del arriendo.
+
+    Si el worker muere a mitad de lote, los correos no enviados vuelven a estar pendientes al vencer el arriendo.
+    """
+    with transaction.atomic():
+        # skip_locked: varios workers pueden correr a la vez sin tomar el mismo correo
+        batch = list(OutboundEmail.objects.select_for_update(skip_locked=True)
+                     .filter(status='pending', next_attempt_at__lte=timezone.now())
+                     .order_by('next_attempt_at')[:batch_size])
+        OutboundEmail.objects.filter(id__in=[o.id for o in batch]).update(next_attempt_at=timezone.now() + lease)
+    return batch
+
+
+def send_pending(batch_size=50, max_attempts=5, rate=0):
+    """Envía un lote de correos pendientes por una sola conexión SMTP. Devuelve (enviados, fallidos).
+
+    Los envíos (y las pausas del límite de envío) ocurren fuera de cualquier transacción: cada resultado
+    se guarda con su propio UPDATE, así un SMTP lento no retiene bloqueos ni deja transacciones abiertas.
+    """
+    sent = failed = 0
+    interval = 1.0 / rate if rate else 0
+    batch = claim_batch(batch_size, lease_for(batch_size, interval))
+    if not batch:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        # Servidor caído: se libera el arriendo para reintentar en la próxima vuelta del worker
+        OutboundEmail.objects.filter(id__in=[o.id for o in batch]).update(next_attempt_at=timezone.now())
+        raise
+    try:
+        for outbound in batch:
+            started = time.monotonic()
+            email = EmailMessage(outbound.subject, outbound.body, None, outbound.recipients, connection=connection)
+            outbound.attempts += 1
+            try:
+                connection.send_messages([email])
+            except Exception as e:
+                outbound.last_error = str(e)[:1000]
+                if outbound.attempts >= max_attempts:
+                    outbound.status = 'failed'
+                else:
+                    outbound.next_attempt_at = timezone.now() + backoff(outbound.attempts)
+                failed += 1
+                # La conexión pudo quedar rota: se reabre para el resto del lote
+                connection.close()
+                try: connection.open()
+                except Exception: pass
+            else:
+                outbound.status = 'sent'
+                outbound.sent_at = timezone.now()
+                sent += 1
+            outbound.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error', 'sent_at'])
+            # Límite de envío (correos por segundo) para no exceder la cuota del proveedor SMTP
+            if interval:
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def purge_sent(days):
+    """Borra correos ya enviados (pueden contener contraseñas temporales)."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboundEmail.objects.filter(status='sent', sent_at__lt=cutoff).delete()[0]
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from pathlib import Path
+import time
+
+from api.archive import advance_horizon, archive_batch
+from api.models import UserTask
+from api.rollups import local_day_bounds, rebuild_global_stats
+
+
+class Command(BaseCommand):
+    help = ('Archiva las completaciones antiguas de UserTask: resumen mensual por usuario (ArchivedMonth) y filas crudas '
+            'a ArchivedUserTask o a archivos NDJSON comprimidos. Por lotes; se puede interrumpir y relanzar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, help='Archivar lo completado hace más de N días')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por lote (una transacción cada uno)')
+        parser.add_argument('--ndjson-dir', help='Guardar las filas en <dir>/usertask-*.ndjson.gz en vez de ArchivedUserTask')
+        parser.add_argument('--max-batches', type=int, default=None, help='Detenerse tras N lotes (ventanas de mantenimiento)')
+        parser.add_argument('--sleep', type=float, default=0, help='Segundos de pausa entre lotes (menos presión sobre la BD)')
+
+    def handle(self, *args, **opts):
+        # Las claves de idempotencia solo se comprueban en UserTask: lo archivado ya no protege contra reintentos
+        min_days = max(1, getattr(settings, 'IDEMPOTENCY_RETRY_DAYS', 30))
+        if opts['older_than'] < min_days:
+            raise CommandError(f'--older-than debe ser al menos {min_days} días (IDEMPOTENCY_RETRY_DAYS)')
+        if opts['ndjson_dir']:
+            Path(opts['ndjson_dir']).mkdir(parents=True, exist_ok=True)
+        cutoff = timezone.localdate() - timedelta(days=opts['older_than'])
+
+        with transaction.atomic():
+            advance_horizon(cutoff)
+        self.stdout.write(f"🗄️ Archivando completaciones anteriores al {cutoff}...")
+
+        moved = batches = 0
+        while opts['max_batches'] is None or batches < opts['max_batches']:
+            rows = archive_batch(cutoff, opts['batch_size'], opts['ndjson_dir'])
+            if not rows:
+                break
+            moved += rows
+            batches += 1
+            self.stdout.write(f"  Lote {batches}: {moved} filas archivadas")
+            if opts['sleep']:
+                time.sleep(opts['sleep'])
+
+        # Los perfiles no se tocan: GlobalStat debe seguir cuadrando con ellos y con UserTask + resúmenes archivados
+        drift = rebuild_global_stats(dry_run=True)
+        if drift:
+            self.stdout.write(self.style.WARNING(f"⚠️ {len(drift)} períodos con deriva: revisa con reconcile_stats --dry-run"))
+        pending = UserTask.objects.filter(completed_at__lt=local_day_bounds(cutoff, cutoff)[0]).exists()
+        msg = f"✅ {moved} completaciones archivadas en {batches} lotes."
+        if pending:
+            msg += ' Quedan filas por archivar: vuelve a ejecutar el comando.'
+        self.stdout.write(self.style.SUCCESS(msg))
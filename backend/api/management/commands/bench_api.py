@@ -0,0 +1,235 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+import urllib.error
+
+from api.models import Task
+
+# (nombre, método, ruta, ¿requiere admin?)
+SCENARIOS = [
+    ('login', 'POST', '/api/login/', False),
+    ('dashboard', 'GET', '/api/dashboard/', False),
+    ('tasks', 'GET', '/api/tasks/', False),
+    ('ranking', 'GET', '/api/ranking/', False),
+    ('history', 'GET', '/api/history/', False),
+    ('complete', 'POST', '/api/task/complete/', False),
+    ('admin_dashboard', 'GET', '/api/admin/dashboard/', True),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+def summarize(timings, elapsed, queries=None):
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "p50_ms": percentile(timings, 50),
+        "p95_ms": percentile(timings, 95),
+        "p99_ms": percentile(timings, 99),
+        "mean_ms": round(sum(timings) / len(timings), 2) if timings else None,
+        "throughput_rps": round(len(timings) / elapsed, 1) if elapsed else None,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de la API REST: latencia p50/p95/p99, consultas por petición y throughput (resultados en JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Usuarios de prueba a sembrar')
+        parser.add_argument('--completions', type=int, default=20_000, help='Completaciones de prueba a sembrar')
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por escenario')
+        parser.add_argument('--only', nargs='+', choices=[s[0] for s in SCENARIOS], help='Limitar a estos escenarios')
+        parser.add_argument('--gunicorn', action='store_true',
+                            help='Levanta gunicorn local sobre la BD configurada y lo ataca con clientes concurrentes')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Con --gunicorn: sirve core.asgi con workers uvicorn y las vistas async (ASYNC_API=1)')
+        parser.add_argument('--workers', type=int, default=4, help='Workers de gunicorn')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clientes concurrentes (modo gunicorn)')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--no-seed', action='store_true', help='No sembrar datos (modo gunicorn con BD ya cargada)')
+        parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--compare', help='JSON de una corrida anterior para mostrar la diferencia')
+        parser.add_argument('--password', default='Eco123456')
+
+    def handle(self, *args, **opts):
+        scenarios = [s for s in SCENARIOS if not opts['only'] or s[0] in opts['only']]
+        if opts['gunicorn']:
+            results = self.run_gunicorn(scenarios, opts)
+        else:
+            results = self.run_test_client(scenarios, opts)
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "mode": results.pop('mode'),
+            "config": {k: opts[k] for k in ('users', 'completions', 'requests', 'workers', 'concurrency')},
+            "endpoints": results,
+        }
+        self.print_report(report, opts['compare'])
+        if opts['output']:
+            Path(opts['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {opts['output']}"))
+
+    # --- DATOS ---
+    def seed(self, opts):
+        call_command('seed_data', users=opts['users'], completions=opts['completions'],
+                     password=opts['password'], stdout=open(os.devnull, 'w'))
+        emails = list(User.objects.filter(username__startswith='eco-').values_list('email', flat=True)[:50])
+        if not emails:
+            raise CommandError('No hay usuarios de prueba: ejecuta seed_data --users N o quita --no-seed')
+        admin = User.objects.filter(is_superuser=True).values_list('email', flat=True).first()
+        return emails, admin, list(Task.objects.values_list('id', flat=True))
+
+    def payload(self, name, email, tasks, opts):
+        if name == 'login':
+            return {'email': email, 'password': opts['password']}
+        if name == 'complete':
+            return {'task_id': random.choice(tasks)}
+        return None
+
+    # --- MODO TEST CLIENT (BD de pruebas aislada, mide consultas) ---
+    # El benchmark hace muchos logins desde una misma IP y completa las mismas tareas sin pausa
+    @override_settings(AUTH_THROTTLE_RATES={}, COMPLETION_LIMITS_ENABLED=False)
+    def run_test_client(self, scenarios, opts):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            emails, admin, tasks = self.seed(opts)
+            admin_password = os.environ.get('DJANGO_SUPERUSER_PASSWORD', 'Eco123456')
+            tokens = {e: self.login(Client(), e, opts['password']) for e in emails[:10]}
+            admin_token = self.login(Client(), admin, admin_password)
+
+            results = {}
+            for name, method, path, needs_admin in scenarios:
+                client = Client()
+                timings, queries = [], []
+                started = time.perf_counter()
+                for _ in range(opts['requests']):
+                    email = random.choice(list(tokens))
+                    token = admin_token if needs_admin else tokens[email]
+                    headers = {} if name == 'login' else {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+                    data = self.payload(name, email, tasks, opts)
+                    with CaptureQueriesContext(connection) as ctx:
+                        t0 = time.perf_counter()
+                        if method == 'POST':
+                            res = client.post(path, data, content_type='application/json', **headers)
+                        else:
+                            res = client.get(path, **headers)
+                        timings.append((time.perf_counter() - t0) * 1000)
+                    if res.status_code >= 400:
+                        raise CommandError(f'{name}: respuesta {res.status_code}')
+                    queries.append(len(ctx.captured_queries))
+                results[name] = summarize(timings, time.perf_counter() - started, queries)
+            results['mode'] = 'test-client'
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def login(self, client, email, password):
+        res = client.post('/api/login/', {'email': email, 'password': password}, content_type='application/json')
+        if res.status_code != 200:
+            raise CommandError(f'No se pudo iniciar sesión como {email}')
+        return res.json()['access']
+
+    # --- MODO GUNICORN (HTTP real, clientes concurrentes) ---
+    def server_command(self, opts):
+        app = ['core.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'] if opts['asgi'] else ['core.wsgi']
+        return [sys.executable, '-m', 'gunicorn', *app, '-w', str(opts['workers']),
+                '-b', f"127.0.0.1:{opts['port']}", '--log-level', 'warning']
+
+    def run_gunicorn(self, scenarios, opts):
+        if opts['no_seed']:
+            emails, admin, tasks = self.seed({**opts, 'users': 0, 'completions': 0})
+        else:
+            emails, admin, tasks = self.seed(opts)
+        base = f"http://127.0.0.1:{opts['port']}"
+        server = subprocess.Popen(self.server_command(opts), cwd=Path(__file__).resolve().parents[3],
+                                  env={**os.environ, 'AUTH_THROTTLE': '0', 'COMPLETION_LIMITS': '0', 'API_METRICS': '0', 'ASYNC_API': '1' if opts['asgi'] else '0'})
+        try:
+            self.wait_for(base)
+            admin_password = os.environ.get('DJANGO_SUPERUSER_PASSWORD', 'Eco123456')
+            tokens = {e: self.http(base, 'POST', '/api/login/', self.payload('login', e, tasks, opts))[1]['access']
+                      for e in emails[:10]}
+            admin_token = self.http(base, 'POST', '/api/login/', {'email': admin, 'password': admin_password})[1]['access']
+
+            results = {}
+            for name, method, path, needs_admin in scenarios:
+                def one(_):
+                    email = random.choice(list(tokens))
+                    token = None if name == 'login' else (admin_token if needs_admin else tokens[email])
+                    t0 = time.perf_counter()
+                    self.http(base, method, path, self.payload(name, email, tasks, opts), token)
+                    return (time.perf_counter() - t0) * 1000
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(opts['concurrency']) as pool:
+                    timings = list(pool.map(one, range(opts['requests'])))
+                results[name] = summarize(timings, time.perf_counter() - started)
+            results['mode'] = f"gunicorn{' asgi' if opts['asgi'] else ''} x{opts['workers']} / {opts['concurrency']} clientes"
+            return results
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    def wait_for(self, base, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(base + '/api/ranking/', timeout=2)
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError('El servidor no respondió a tiempo')
+
+    def http(self, base, method, path, data=None, token=None):
+        body = json.dumps(data).encode() if data is not None else None
+        req = urllib.request.Request(base + path, data=body, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if token:
+            req.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(req, timeout=30) as res:
+                return res.status, json.loads(res.read() or b'null')
+        except urllib.error.HTTPError as e:
+            raise CommandError(f'{method} {path}: respuesta {e.code}')
+
+    # --- REPORTE ---
+    def print_report(self, report, compare_path):
+        previous = json.loads(Path(compare_path).read_text())['endpoints'] if compare_path else {}
+        self.stdout.write(f"Commit {report['commit']} | {report['mode']}")
+        self.stdout.write(f"{'escenario':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'queries':>9}")
+        for name, r in report['endpoints'].items():
+            line = (f"{name:<16}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['throughput_rps']:>9}"
+                    f"{r['queries_per_request'] if r['queries_per_request'] is not None else '-':>9}")
+            old = previous.get(name)
+            if old and old.get('p50_ms'):
+                line += f"   p50 {(r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100:+.0f}%"
+            self.stdout.write(line)
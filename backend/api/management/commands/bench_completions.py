@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from rest_framework.test import APIClient
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from api.leaderboard import get_leaderboard
+from api.models import Profile, Task
+from api.rollups import discount_user
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga: muchos hilos completando tareas para un mismo usuario (verifica que no se pierdan puntos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=25, help='Peticiones por hilo')
+
+    def handle(self, *args, **opts):
+        email = 'bench-completions@ecopoints.local'
+        User.objects.filter(username=email).delete()
+        user = User.objects.create_user(username=email, email=email, first_name='Bench')
+        Profile.objects.create(user=user)
+        task = Task.objects.create(title='Bench completions', points=10)
+
+        def worker(_):
+            client = APIClient()
+            client.force_authenticate(User.objects.get(id=user.id))
+            timings, errors = [], 0
+            try:
+                for _ in range(opts['requests']):
+                    start = time.perf_counter()
+                    res = client.post('/api/task/complete/', {'task_id': task.id}, format='json')
+                    timings.append((time.perf_counter() - start) * 1000)
+                    errors += res.status_code != 200
+            finally:
+                connection.close()
+            return timings, errors
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(opts['threads']) as pool:
+                results = list(pool.map(worker, range(opts['threads'])))
+            elapsed = time.perf_counter() - start
+
+            timings = sorted(t for r in results for t in r[0])
+            errors = sum(r[1] for r in results)
+            ok = len(timings) - errors
+            points = Profile.objects.get(user=user).points
+        finally:
+            # Igual que el borrado del admin: se descuenta de los rollups globales antes de borrar
+            with transaction.atomic():
+                discount_user(user.id)
+                user.delete()
+                task.delete()
+            get_leaderboard().remove(user.id)
+
+        self.stdout.write(
+            f"{len(timings)} peticiones ({opts['threads']} hilos) en {elapsed:.2f}s | "
+            f"p50={timings[len(timings) // 2]:.1f}ms | p95={timings[int(len(timings) * 0.95)]:.1f}ms | errores={errors}"
+        )
+        if points != ok * task.points:
+            raise CommandError(f"Puntos perdidos: esperado {ok * task.points}, obtenido {points}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Sin pérdidas: {points} puntos para {ok} completaciones."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from rest_framework.renderers import JSONRenderer
+import time
+
+from api.models import Profile, Task
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import TASK_FIELDS, TaskSerializer, UserSerializer, user_payload
+
+
+class Command(BaseCommand):
+    help = 'Mide la CPU por respuesta de /api/profile/ y /api/tasks/: serializers + JSONRenderer vs proyección + orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20_000)
+        parser.add_argument('--tasks', type=int, default=30, help='Tareas en el catálogo simulado')
+
+    def handle(self, *args, **opts):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson no está instalado: el renderer rápido usa el de DRF'))
+        # Objetos en memoria (sin BD): se mide solo serialización y render, como con el User+Profile cacheado
+        user = User(id=1, username='eco@ecopoints.cl', email='eco@ecopoints.cl', first_name='Eco Ñandú')
+        Profile(user=user, points=1234, co2_saved=61.7, level='Eco-Guardián')
+        tasks = [Task(id=i, title=f'Reciclar botellas {i}', points=10 * i, description='Fácil', icon_type='plastic')
+                 for i in range(1, opts['tasks'] + 1)]
+        rows = [{f: getattr(t, f) for f in TASK_FIELDS} for t in tasks]
+
+        cases = [
+            ('profile', lambda: JSONRenderer().render(UserSerializer(user).data),
+                        lambda: FastJSONRenderer().render(user_payload(user))),
+            ('tasks', lambda: JSONRenderer().render(TaskSerializer(tasks, many=True).data),
+                      lambda: FastJSONRenderer().render(rows)),
+        ]
+        for name, before, after in cases:
+            if before() != after():
+                self.stdout.write(self.style.ERROR(f'{name}: la salida no es idéntica'))
+            old, new = self.measure(before, opts['iterations']), self.measure(after, opts['iterations'])
+            self.stdout.write(f"{name:<8} | antes={old:.1f}µs | después={new:.1f}µs | x{old / new:.1f}")
+
+    def measure(self, fn, iterations):
+        start = time.process_time()
+        for _ in range(iterations):
+            fn()
+        return (time.process_time() - start) / iterations * 1e6
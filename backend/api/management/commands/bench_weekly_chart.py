@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+import random
+import time
+
+from api.models import Task, UserTask
+from api.rollups import rebuild_user_rollups, rebuild_global_rollups
+from api.views import get_weekly_chart_data
+from api.management.commands.seed_data import explicit_completed_at
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas y latencia de get_weekly_chart_data con N filas de UserTask (datos temporales)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--days', type=int, default=30, help='Días de historia sobre los que repartir las filas')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        for rows in opts['rows']:
+            # Todo se ejecuta dentro de una transacción que se revierte al final
+            try:
+                with transaction.atomic():
+                    self.run_case(rows, opts)
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def run_case(self, rows, opts):
+        User.objects.bulk_create([
+            User(username=f'bench-{i}@ecopoints.local', email=f'bench-{i}@ecopoints.local')
+            for i in range(opts['users'])
+        ])
+        users = list(User.objects.filter(username__startswith='bench-').values_list('id', flat=True))
+        Task.objects.bulk_create([Task(title=f'Bench {p}', points=p) for p in (10, 20, 50, 100)])
+        tasks = list(Task.objects.filter(title__startswith='Bench ').values_list('id', flat=True))
+
+        with explicit_completed_at():
+            now = timezone.now()
+            span = opts['days'] * 86400
+            for offset in range(0, rows, opts['batch_size']):
+                UserTask.objects.bulk_create([
+                    UserTask(user_id=random.choice(users), task_id=random.choice(tasks),
+                             completed_at=now - timedelta(seconds=random.randrange(span)))
+                    for _ in range(min(opts['batch_size'], rows - offset))
+                ])
+
+        # El gráfico lee de los rollups diarios: se reconstruyen a partir de las filas generadas
+        rebuild_user_rollups(users)
+        rebuild_global_rollups()
+
+        for label, user in (('global', None), ('usuario', User.objects.get(id=users[0]))):
+            timings = []
+            for _ in range(opts['repeat']):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    get_weekly_chart_data(user=user)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{rows:>9} filas | {label:<7} | consultas={len(ctx.captured_queries)} "
+                f"| p50={timings[len(timings) // 2]:.1f}ms | max={timings[-1]:.1f}ms"
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+
+from api.rollups import rebuild_user_rollups, rebuild_global_rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los rollups diarios (DailyStat/GlobalDailyStat) desde el historial de UserTask'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Usuarios por lote')
+        parser.add_argument('--days', type=int, default=None, help='Recalcular solo los últimos N días')
+
+    def handle(self, *args, **opts):
+        batch_size = opts['batch_size']
+        since = timezone.localdate() - timedelta(days=opts['days'] - 1) if opts['days'] else None
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        total_rows = 0
+
+        for i in range(0, len(user_ids), batch_size):
+            batch = user_ids[i:i + batch_size]
+            with transaction.atomic():
+                total_rows += rebuild_user_rollups(batch, since)
+            self.stdout.write(f"  Lote {i // batch_size + 1}: {min(i + batch_size, len(user_ids))}/{len(user_ids)} usuarios")
+
+        with transaction.atomic():
+            days = rebuild_global_rollups(since)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Rollups reconstruidos: {total_rows} filas por usuario, {days} días globales."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.levels import get_levels, recompute_levels
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el nivel de todos los perfiles según la tabla de niveles (UPDATE por lotes, solo filas que cambian)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Perfiles (rango de ids) por UPDATE')
+
+    def handle(self, *args, **opts):
+        levels = get_levels()
+        self.stdout.write(f"Niveles: {', '.join(f'{n} ({t})' for t, n in zip(levels.thresholds, levels.names))}")
+        changed = recompute_levels(opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {changed} perfiles cambiaron de nivel."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild_global_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales globales (GlobalStat) desde perfiles y UserTask y corrige la deriva (correr periódicamente, p. ej. cron diario)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa las diferencias, sin corregirlas')
+
+    def handle(self, *args, **opts):
+        drift = rebuild_global_stats(dry_run=opts['dry_run'])
+        for period, (stored, fresh) in sorted(drift.items()):
+            stored = f"{stored[0]} pts / {stored[1]} kg / {stored[2]} tareas" if stored else 'sin fila'
+            self.stdout.write(f"  {period}: {stored} -> {fresh[0]} pts / {round(fresh[1], 2)} kg / {fresh[2]} tareas")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("✅ Totales globales al día, sin deriva."))
+        elif opts['dry_run']:
+            self.stdout.write(self.style.WARNING(f"⚠️ {len(drift)} períodos con deriva (sin corregir: --dry-run)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(drift)} períodos corregidos."))
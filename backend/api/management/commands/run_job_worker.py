@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+import time
+
+from api.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de admin en segundo plano (AdminJob), p. ej. borrados masivos de usuarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesa lo pendiente y termina')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Usuarios por grupo (el progreso se guarda tras cada uno)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas de historial por DELETE')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos de espera cuando no hay pendientes')
+
+    def handle(self, *args, **opts):
+        self.stdout.write("🧹 Worker de trabajos iniciado...")
+        while True:
+            job = claim_job()
+            if job is None:
+                if opts['once']: break
+                time.sleep(opts['interval'])
+                continue
+            run_job(job, opts['chunk_size'], opts['batch_size'])
+            self.stdout.write(f"  {job}: {job.rows_deleted} filas borradas" + (f" | Error: {job.last_error}" if job.last_error else ''))
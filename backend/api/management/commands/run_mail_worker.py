@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+import time
+
+from api.mail import send_pending, purge_sent
+
+
+class Command(BaseCommand):
+    help = 'Procesa la bandeja de salida de correos (OutboundEmail) con reintentos y límite de envío'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesa lo pendiente y termina')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--rate', type=float, default=5, help='Correos por segundo (0 = sin límite)')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos de espera cuando no hay pendientes')
+        parser.add_argument('--purge-after', type=int, default=7, help='Días que se conservan los correos enviados')
+
+    def handle(self, *args, **opts):
+        self.stdout.write("📬 Worker de correos iniciado...")
+        while True:
+            try:
+                sent, failed = send_pending(opts['batch_size'], opts['max_attempts'], opts['rate'])
+            except Exception as e:
+                # Servidor SMTP caído: el lote se revierte y se reintenta más tarde
+                self.stderr.write(f"Error conectando al servidor de correo: {e}")
+                if opts['once']: raise
+                time.sleep(opts['interval'])
+                continue
+            if sent or failed:
+                self.stdout.write(f"  Enviados: {sent} | Fallidos: {failed}")
+            elif opts['once']:
+                break
+            else:
+                purge_sent(opts['purge_after'])
+                time.sleep(opts['interval'])
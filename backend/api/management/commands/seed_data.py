@@ -1,10 +1,44 @@
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from api.models import Profile, Task
+from django.db import transaction
+from django.utils import timezone
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+from api.levels import recompute_levels
+from api.models import Profile, Task, UserTask
+from api.rollups import CO2_PER_POINT, rebuild_user_rollups, rebuild_global_rollups, rebuild_global_stats
 import os
+import random
+
+FIRST_NAMES = ['Ana', 'Benjamín', 'Camila', 'Diego', 'Fernanda', 'Matías', 'Josefa', 'Tomás', 'Valentina', 'Vicente',
+               'Martina', 'Agustín', 'Isidora', 'Joaquín', 'Florencia', 'Lucas', 'Antonia', 'Cristóbal', 'Emilia', 'Maximiliano']
+LAST_NAMES = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+# Peso de cada hora local del día: casi nada de madrugada, picos a media mañana y al salir del trabajo
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 12, 14, 14, 12, 10, 10, 10, 11, 12, 14, 16, 16, 13, 9, 5, 2]
+
+
+@contextmanager
+def explicit_completed_at():
+    """Permite fijar completed_at en bulk_create (auto_now_add lo pisaría con la hora actual)."""
+    field = UserTask._meta.get_field('completed_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
 
 class Command(BaseCommand):
-    help = 'Carga datos iniciales y Superusuario'
+    help = 'Carga datos iniciales y Superusuario (y opcionalmente usuarios/completaciones de prueba)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Usuarios de prueba a generar')
+        parser.add_argument('--completions', type=int, default=0, help='Completaciones de prueba a generar')
+        parser.add_argument('--days', type=int, default=90, help='Días de historia sobre los que repartir las completaciones')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--password', default='Eco123456', help='Contraseña de los usuarios de prueba')
 
     def handle(self, *args, **kwargs):
         self.stdout.write("Iniciando carga de datos...")
@@ -33,14 +67,98 @@ class Command(BaseCommand):
 
         # --- 2. TAREAS ---
         tasks_data = [
-            {"title": "Reciclar 2 botellas de plástico", "points": 50, "description": "Fácil", "icon_type": "plastic"},
-            {"title": "Juntar 3 cajas de cartón", "points": 30, "description": "Fácil", "icon_type": "box"},
-            {"title": "Llevar ropa a punto limpio", "points": 100, "description": "Medio", "icon_type": "shirt"},
-            {"title": "Usar bolsas reutilizables", "points": 20, "description": "Diario", "icon_type": "bag"},
-            {"title": "Reciclar latas de aluminio", "points": 60, "description": "Fácil", "icon_type": "can"},
+            {"title": "Reciclar 2 botellas de plástico", "points": 50, "description": "Fácil", "icon_type": "plastic", "cooldown_seconds": 60, "daily_limit": 10},
+            {"title": "Juntar 3 cajas de cartón", "points": 30, "description": "Fácil", "icon_type": "box", "cooldown_seconds": 60, "daily_limit": 10},
+            {"title": "Llevar ropa a punto limpio", "points": 100, "description": "Medio", "icon_type": "shirt", "cooldown_seconds": 3600, "daily_limit": 2},
+            {"title": "Usar bolsas reutilizables", "points": 20, "description": "Diario", "icon_type": "bag", "cooldown_seconds": 3600, "daily_limit": 1},
+            {"title": "Reciclar latas de aluminio", "points": 60, "description": "Fácil", "icon_type": "can", "cooldown_seconds": 60, "daily_limit": 10},
         ]
 
         for t in tasks_data:
             Task.objects.get_or_create(title=t['title'], defaults=t)
         
-        self.stdout.write(self.style.SUCCESS(f"✅ Se aseguraron {len(tasks_data)} tareas base."))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"✅ Se aseguraron {len(tasks_data)} tareas base."))
+
+        # --- 3. DATOS DE PRUEBA A ESCALA (benchmarks) ---
+        if kwargs['users'] or kwargs['completions']:
+            self.seed_volume(kwargs['users'], kwargs['completions'], kwargs['days'], kwargs['batch_size'], kwargs['password'])
+
+    def seed_volume(self, n_users, n_completions, days, batch_size, password):
+        started = timezone.now()
+        self.create_users(n_users, days, batch_size, password)
+
+        user_ids = list(User.objects.filter(username__startswith='eco-').order_by('id').values_list('id', flat=True))
+        task_points = dict(Task.objects.values_list('id', 'points'))
+        if n_completions and user_ids and task_points:
+            earned = self.create_completions(user_ids, task_points, n_completions, days, batch_size)
+            self.credit_profiles(earned, batch_size)
+            recompute_levels(batch_size)
+
+            # Rollups diarios por lotes de usuarios + global
+            touched = sorted(earned)
+            for i in range(0, len(touched), 500):
+                with transaction.atomic():
+                    rebuild_user_rollups(touched[i:i + 500])
+            with transaction.atomic():
+                rebuild_global_rollups()
+            rebuild_global_stats()
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Datos de prueba: {n_users} usuarios y {n_completions} completaciones en {elapsed:.1f}s."))
+
+    def create_users(self, n_users, days, batch_size, password):
+        # Un solo hash precalculado: evita el costo de create_user (PBKDF2) por cada usuario
+        hashed = make_password(password)
+        start = User.objects.filter(username__startswith='eco-').count()
+        now = timezone.now()
+        for offset in range(start, start + n_users, batch_size):
+            emails = [f'eco-{i}@ecopoints.local' for i in range(offset, min(offset + batch_size, start + n_users))]
+            with transaction.atomic():
+                User.objects.bulk_create([
+                    User(username=e, email=e, password=hashed, first_name=random.choice(FIRST_NAMES),
+                         last_name=random.choice(LAST_NAMES), date_joined=now - timedelta(seconds=random.randrange(days * 86400 + 1)))
+                    for e in emails
+                ])
+                ids = User.objects.filter(username__in=emails).values_list('id', flat=True)
+                Profile.objects.bulk_create([Profile(user_id=uid) for uid in ids])
+            self.stdout.write(f"  Usuarios: {offset + len(emails) - start}/{n_users}")
+
+    def create_completions(self, user_ids, task_points, n_completions, days, batch_size):
+        """Inserta completaciones repartidas en el tiempo; devuelve los puntos ganados por usuario."""
+        # Actividad desigual entre usuarios (pocos muy activos, muchos ocasionales)
+        cum_weights = list(accumulate(random.paretovariate(1.2) for _ in user_ids))
+        task_ids = list(task_points)
+        today = timezone.localdate()
+        midnights = [timezone.make_aware(datetime.combine(today - timedelta(days=d), time.min)) for d in range(days)]
+        now = timezone.now()
+        earned = {}
+
+        with explicit_completed_at():
+            for offset in range(0, n_completions, batch_size):
+                size = min(batch_size, n_completions - offset)
+                users = random.choices(user_ids, cum_weights=cum_weights, k=size)
+                tasks = random.choices(task_ids, k=size)
+                # Más actividad en los días recientes que en los antiguos
+                day_idx = [min(days - 1, int(random.triangular(0, days, 0))) for _ in range(size)]
+                hours = random.choices(range(24), weights=HOUR_WEIGHTS, k=size)
+                rows = []
+                for uid, tid, d, h in zip(users, tasks, day_idx, hours):
+                    completed_at = min(now, midnights[d] + timedelta(hours=h, seconds=random.randrange(3600)))
+                    rows.append(UserTask(user_id=uid, task_id=tid, completed_at=completed_at))
+                    earned[uid] = earned.get(uid, 0) + task_points[tid]
+                with transaction.atomic():
+                    UserTask.objects.bulk_create(rows)
+                self.stdout.write(f"  Completaciones: {offset + size}/{n_completions}")
+        return earned
+
+    def credit_profiles(self, earned, batch_size):
+        """Suma a cada perfil exactamente lo generado (points y co2_saved coherentes con el historial)."""
+        user_ids = sorted(earned)
+        for i in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                profiles = list(Profile.objects.filter(user_id__in=user_ids[i:i + batch_size]))
+                for p in profiles:
+                    p.points += earned[p.user_id]
+                    p.co2_saved += earned[p.user_id] * CO2_PER_POINT
+                Profile.objects.bulk_update(profiles, ['points', 'co2_saved'], batch_size=1000)
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from collections import Counter, deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger('api.metrics')
+
+# Límites (ms) de los buckets del histograma de latencia
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class QueryTracker:
+    """execute_wrapper que cuenta consultas, tiempo en BD y SQL repetido dentro de una petición."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+
+class MetricsRegistry:
+    """Ventana móvil de muestras por vista (en memoria del proceso)."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, wall_ms, db_ms, queries, repeated):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {"samples": deque(maxlen=self.window), "requests": 0, "n_plus_one": 0}
+            stats["samples"].append((wall_ms, db_ms, queries))
+            stats["requests"] += 1
+            stats["n_plus_one"] += bool(repeated)
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: (list(s["samples"]), s["requests"], s["n_plus_one"]) for name, s in self._views.items()}
+        data = {}
+        for name, (samples, requests, n_plus_one) in views.items():
+            wall = sorted(s[0] for s in samples)
+            histogram = {f"le_{b}": 0 for b in BUCKETS_MS}
+            histogram["inf"] = 0
+            for ms in wall:
+                histogram[next((f"le_{b}" for b in BUCKETS_MS if ms <= b), "inf")] += 1
+            data[name] = {
+                "requests": requests,
+                "window": len(samples),
+                "p50_ms": round(wall[len(wall) // 2], 2),
+                "p95_ms": round(wall[int(len(wall) * 0.95)], 2),
+                "p99_ms": round(wall[int(len(wall) * 0.99)], 2),
+                "mean_db_ms": round(sum(s[1] for s in samples) / len(samples), 2),
+                "mean_queries": round(sum(s[2] for s in samples) / len(samples), 2),
+                "max_queries": max(s[2] for s in samples),
+                "n_plus_one_requests": n_plus_one,
+                "histogram": histogram,
+            }
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+metrics = MetricsRegistry(getattr(settings, 'API_METRICS_WINDOW', 1000))
+
+
+class QueryMetricsMiddleware:
+    """Mide tiempo total, consultas y tiempo en BD por vista; expone Server-Timing.
+
+    Con API_METRICS_ENABLED = False Django descarta el middleware al arrancar (costo cero).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'API_METRICS_REPEAT_THRESHOLD', 3)
+
+    def __call__(self, request):
+        tracker = QueryTracker()
+        start = time.perf_counter()
+        with connection.execute_wrapper(tracker):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+        db_ms = tracker.db_time * 1000
+
+        match = request.resolver_match
+        view = match.route if match else 'sin-ruta'
+        repeated = tracker.repeated(self.threshold)
+        if repeated:
+            worst = max(repeated.items(), key=lambda kv: kv[1])
+            logger.warning("Posible N+1 en %s: %d consultas idénticas: %s", view, worst[1], worst[0][:200])
+        metrics.record(view, wall_ms, db_ms, tracker.count, repeated)
+
+        response['Server-Timing'] = (f'app;dur={wall_ms:.1f}, db;dur={db_ms:.1f};desc="{tracker.count} queries"')
+        return response
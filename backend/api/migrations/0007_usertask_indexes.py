@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_profile_points_rank_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertask',
+            index=models.Index(fields=['user', '-completed_at'], name='usertask_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertask',
+            index=models.Index(fields=['completed_at'], name='usertask_completed_at_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_usertask_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usertask',
+            name='usertask_user_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='usertask',
+            index=models.Index(fields=['user', '-completed_at', '-id'], name='usertask_user_recent_idx'),
+        ),
+    ]
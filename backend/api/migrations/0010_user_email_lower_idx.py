@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_outboundemail'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        # auth_user pertenece a django.contrib.auth: el índice funcional se crea con SQL (válido en SQLite y PostgreSQL)
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS api_user_email_lower_idx ON auth_user (LOWER(email));',
+            'DROP INDEX IF EXISTS api_user_email_lower_idx;',
+        ),
+    ]
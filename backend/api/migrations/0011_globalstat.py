@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:14
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+CO2_PER_POINT = 0.05
+
+
+def populate(apps, schema_editor):
+    # Carga inicial desde los datos existentes (luego se mantiene en línea y con reconcile_stats)
+    Profile, UserTask, GlobalStat = (apps.get_model('api', m) for m in ('Profile', 'UserTask', 'GlobalStat'))
+    stats = {}
+    months = (UserTask.objects.annotate(month=TruncMonth('completed_at'))
+              .values('month').annotate(points=Sum('task__points'), tasks=Count('id')).order_by())
+    for row in months:
+        for period in (f"{row['month']:%Y}", f"{row['month']:%Y-%m}"):
+            stat = stats.setdefault(period, GlobalStat(period=period))
+            stat.points += row['points']
+            stat.co2 += row['points'] * CO2_PER_POINT
+            stat.tasks += row['tasks']
+    totals = Profile.objects.aggregate(points=Sum('points'), co2=Sum('co2_saved'))
+    stats['all'] = GlobalStat(period='all', points=totals['points'] or 0, co2=totals['co2'] or 0.0,
+                              tasks=UserTask.objects.count())
+    GlobalStat.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalStat',
+            fields=[
+                ('period', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('points', models.BigIntegerField(default=0)),
+                ('co2', models.FloatField(default=0.0)),
+                ('tasks', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:17
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+LEVELS = [
+    ('Eco-Iniciado', 0),
+    ('Eco-Aprendiz', 1000),
+    ('Eco-Explorador', 2500),
+    ('Eco-Guardián', 5000),
+    ('Eco-Héroe', 10000),
+    ('Eco-Leyenda', 20000),
+]
+
+
+def create_levels(apps, schema_editor):
+    Level, Profile = apps.get_model('api', 'Level'), apps.get_model('api', 'Profile')
+    Level.objects.bulk_create([Level(name=name, min_points=points) for name, points in LEVELS])
+    # Los perfiles existentes pasan al nivel que les corresponde (staff conserva su etiqueta)
+    Profile.objects.filter(user__is_staff=False, user__is_superuser=False).update(level=Case(
+        *[When(points__gte=points, then=Value(name)) for name, points in reversed(LEVELS)], default=Value(LEVELS[0][0])
+    ))
+
+
+def delete_levels(apps, schema_editor):
+    apps.get_model('api', 'Level').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_globalstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Level',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('min_points', models.PositiveIntegerField(unique=True)),
+            ],
+            options={
+                'ordering': ['min_points'],
+            },
+        ),
+        migrations.RunPython(create_levels, delete_levels),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_adminjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='cooldown_seconds',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='daily_limit',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
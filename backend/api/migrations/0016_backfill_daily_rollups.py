@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:02
+
+from datetime import datetime, time
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+CO2_PER_POINT = 0.05
+
+
+def backfill(apps, schema_editor):
+    # 0004 creó DailyStat/GlobalDailyStat vacías: las completaciones anteriores no se veían en dashboards ni analítica.
+    # Se recalculan desde UserTask (como rebuild_rollups); los días anteriores al horizonte del archivo se conservan.
+    UserTask, DailyStat, GlobalDailyStat, ArchiveCheckpoint = (
+        apps.get_model('api', m) for m in ('UserTask', 'DailyStat', 'GlobalDailyStat', 'ArchiveCheckpoint'))
+    history, stats, days = UserTask.objects.all(), DailyStat.objects.all(), GlobalDailyStat.objects.all()
+    horizon = ArchiveCheckpoint.objects.values_list('horizon', flat=True).first()
+    if horizon:
+        history = history.filter(completed_at__gte=timezone.make_aware(datetime.combine(horizon, time.min)))
+        stats, days = stats.filter(date__gte=horizon), days.filter(date__gte=horizon)
+    rows = (history.annotate(day=TruncDate('completed_at')).values('user_id', 'day')
+            .annotate(points=Sum('task__points'), tasks=Count('id')).order_by())
+    stats.delete()
+    DailyStat.objects.bulk_create([
+        DailyStat(user_id=r['user_id'], date=r['day'], points=r['points'], co2=r['points'] * CO2_PER_POINT, tasks=r['tasks'])
+        for r in rows
+    ], batch_size=5000)
+    totals = stats.values('date').annotate(points=Sum('points'), co2=Sum('co2'), tasks=Sum('tasks')).order_by()
+    days.delete()
+    GlobalDailyStat.objects.bulk_create([GlobalDailyStat(**r) for r in totals], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_completion_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
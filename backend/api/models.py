@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Profile(models.Model):
@@ -7,10 +8,25 @@ class Profile(models.Model):
     co2_saved = models.FloatField(default=0.0)
     level = models.CharField(max_length=50, default="Eco-Iniciado")
     must_change_password = models.BooleanField(default=False) # <--- NUEVO CAMPO
+
+    class Meta:
+        # Ranking: recorre perfiles en orden de puntos sin ordenar toda la tabla
+        indexes = [models.Index(fields=['-points', 'user'], name='profile_points_rank_idx')]
     
     def __str__(self):
         return f"{self.user.username} - {self.points} pts"
 
+# --- NIVELES (umbrales de puntos; ver api/levels.py) ---
+class Level(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    min_points = models.PositiveIntegerField(unique=True)
+
+    class Meta:
+        ordering = ['min_points']
+
+    def __str__(self):
+        return f"{self.name} ({self.min_points} pts)"
+
 class Task(models.Model):
     # Opciones para el desplegable en Admin
     ICON_CHOICES = [
@@ -27,6 +43,9 @@ class Task(models.Model):
     points = models.IntegerField()
     description = models.CharField(max_length=50, default="Fácil")
     icon_type = models.CharField(max_length=50, default="recycle", choices=ICON_CHOICES)
+    # Antiabuso por usuario (0 = sin límite): segundos entre dos completaciones y máximo en 24 horas móviles
+    cooldown_seconds = models.PositiveIntegerField(default=0)
+    daily_limit = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return self.title
@@ -34,4 +53,141 @@ class Task(models.Model):
 class UserTask(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
-    completed_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    completed_at = models.DateTimeField(auto_now_add=True)
+    # Clave enviada por el cliente para que los reintentos no dupliquen la completación
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Historial por usuario (más recientes primero)
+            models.Index(fields=['user', '-completed_at', '-id'], name='usertask_user_recent_idx'),
+            # Rangos de fecha globales (rollups, análisis)
+            models.Index(fields=['completed_at'], name='usertask_completed_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'], condition=models.Q(idempotency_key__isnull=False),
+                name='usertask_user_idempotency_uniq',
+            ),
+        ]
+
+# --- ROLLUPS DIARIOS (se actualizan al completar tareas) ---
+class DailyStat(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    points = models.IntegerField(default=0)
+    co2 = models.FloatField(default=0.0)
+    tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'date'], name='dailystat_user_date_uniq')]
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.points} pts"
+
+class GlobalDailyStat(models.Model):
+    date = models.DateField(unique=True)
+    points = models.IntegerField(default=0)
+    co2 = models.FloatField(default=0.0)
+    tasks = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.points} pts"
+
+# --- ARCHIVO DE COMPLETACIONES ANTIGUAS (manage.py archive_completions) ---
+# Resumen mensual por usuario de lo que salió de UserTask (month: primer día del mes, hora local)
+class ArchivedMonth(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    points = models.IntegerField(default=0)
+    co2 = models.FloatField(default=0.0)
+    tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'month'], name='archivedmonth_user_month_uniq')]
+
+    def __str__(self):
+        return f"{self.user.username} {self.month:%Y-%m}: {self.points} pts"
+
+# Filas crudas archivadas (mismo id que tenían en UserTask). Guarda los puntos de la tarea al archivar:
+# sin FK a Task, editar o borrar una tarea ya no cambia el archivo.
+class ArchivedUserTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    task_id = models.IntegerField()
+    points = models.IntegerField()
+    completed_at = models.DateTimeField()
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+# Fila única: fecha local antes de la cual el historial puede estar archivado. Los rollups diarios de esos
+# días ya no se pueden recalcular desde UserTask, así que rebuild_rollups no los toca.
+class ArchiveCheckpoint(models.Model):
+    horizon = models.DateField()
+    rows = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+# --- TOTALES GLOBALES PRECALCULADOS (dashboard de admin) ---
+# period: 'all' (total histórico, igual a la suma de los perfiles), 'AAAA' (año) o 'AAAA-MM' (mes)
+class GlobalStat(models.Model):
+    period = models.CharField(max_length=7, primary_key=True)
+    points = models.BigIntegerField(default=0)
+    co2 = models.FloatField(default=0.0)
+    tasks = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.period}: {self.points} pts"
+
+# --- BANDEJA DE SALIDA DE CORREOS (la procesa manage.py run_mail_worker) ---
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('failed', 'Fallido'),
+    ]
+
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, default='pending', choices=STATUS_CHOICES)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+# --- TRABAJOS DE ADMIN EN SEGUNDO PLANO (los procesa manage.py run_job_worker) ---
+class AdminJob(models.Model):
+    KIND_CHOICES = [
+        ('delete_users', 'Borrar usuarios'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En curso'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, default='pending', choices=STATUS_CHOICES)
+    payload = models.JSONField()
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    rows_deleted = models.BigIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Latido del worker: un trabajo 'running' sin latido reciente se retoma (el worker murió)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='adminjob_due_idx')]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.processed}/{self.total}, {self.status})"
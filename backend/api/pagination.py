@@ -0,0 +1,35 @@
+from django.utils.dateparse import parse_date, parse_datetime
+import base64
+import json
+
+
+# --- CURSORES OPACOS PARA PAGINACIÓN KEYSET ---
+def encode_cursor(*values):
+    """Codifica los valores de la última fila de la página (fechas en ISO) como un token opaco."""
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Devuelve (fecha, id) desde un cursor; lanza ValueError si está mal formado."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        stamp, pk = json.loads(raw)
+        when = parse_datetime(stamp)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor inválido') from e
+    if when is None or not isinstance(pk, int):
+        raise ValueError('Cursor inválido')
+    return when, pk
+
+
+def page_size(value, default=50, maximum=200):
+    return min(maximum, max(1, int(value))) if value else default
+
+
+def parse_day(value):
+    """Fecha YYYY-MM-DD de un parámetro de consulta; lanza ValueError si no es válida."""
+    day = parse_date(value)
+    if day is None:
+        raise ValueError('Fecha inválida')
+    return day
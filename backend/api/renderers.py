@@ -0,0 +1,25 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa el JSONRenderer de DRF tal cual
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer respaldado por orjson que produce los mismos bytes que el de DRF.
+
+    Fechas y tipos que orjson no conoce pasan por el encoder de DRF (mismo formato ISO, Decimal, lazy
+    strings...). Con indentación (API navegable, ?indent=) o sin orjson instalado se delega en DRF.
+    """
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # Igual que DRF: \u2028 y \u2029 escapados para que la salida sea un subconjunto estricto de JavaScript
+        if b'\xe2\x80' in ret:
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
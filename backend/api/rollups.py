@@ -0,0 +1,199 @@
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+
+from .models import ArchiveCheckpoint, ArchivedMonth, DailyStat, GlobalDailyStat, GlobalStat, Profile, UserTask
+
+# Estimación CO2: 0.05kg por punto (misma regla que Profile.co2_saved)
+CO2_PER_POINT = 0.05
+
+
+def increment(model, keys, points, co2, tasks):
+    """Incremento atómico en la BD (no se pierden sumas con workers concurrentes).
+
+    El caso común es un solo UPDATE; la fila se crea solo la primera vez.
+    """
+    values = {'points': F('points') + points, 'co2': F('co2') + co2, 'tasks': F('tasks') + tasks}
+    if not model.objects.filter(**keys).update(**values):
+        model.objects.get_or_create(**keys)
+        model.objects.filter(**keys).update(**values)
+
+
+def stat_periods(day):
+    """Filas de GlobalStat que cubren un día: total histórico, año y mes."""
+    return ['all', f'{day:%Y}', f'{day:%Y-%m}']
+
+
+def record_completion(user_id, points, day=None, tasks=1):
+    """Suma una completación a los rollups del usuario y globales (llamar dentro de una transacción)."""
+    day = day or timezone.localdate()
+    co2 = points * CO2_PER_POINT
+    increment(DailyStat, {'user_id': user_id, 'date': day}, points, co2, tasks)
+    increment(GlobalDailyStat, {'date': day}, points, co2, tasks)
+    # Total, año y mes con dos consultas fijas: INSERT de las filas que falten (sin conflicto) + un solo UPDATE
+    periods = stat_periods(day)
+    GlobalStat.objects.bulk_create([GlobalStat(period=p) for p in periods], ignore_conflicts=True)
+    GlobalStat.objects.filter(period__in=periods).update(
+        points=F('points') + points, co2=F('co2') + co2, tasks=F('tasks') + tasks
+    )
+
+
+def adjust_total(points=0, co2=0.0):
+    """Ajusta el total histórico cuando un admin edita los puntos de un perfil a mano."""
+    if points or co2:
+        increment(GlobalStat, {'period': 'all'}, points, co2, 0)
+
+
+def subtract(model, field, deltas):
+    """Resta {clave: (points, co2, tasks)} a varias filas con un solo UPDATE (CASE por fila)."""
+    if not deltas:
+        return
+    def column(i, output):
+        return Case(*[When(**{field: key}, then=Value(d[i])) for key, d in deltas.items()], output_field=output)
+    model.objects.filter(**{f'{field}__in': list(deltas)}).update(
+        points=F('points') - column(0, IntegerField()), co2=F('co2') - column(1, FloatField()),
+        tasks=F('tasks') - column(2, IntegerField()),
+    )
+
+
+def discount_user(user_id):
+    """Resta de los rollups globales lo aportado por un usuario (antes de borrarlo)."""
+    days, periods, tasks = {}, {}, 0
+    for stat in DailyStat.objects.filter(user_id=user_id).values('date', 'points', 'co2', 'tasks'):
+        days[stat['date']] = (stat['points'], stat['co2'], stat['tasks'])
+        for period in stat_periods(stat['date'])[1:]:
+            total = periods.setdefault(period, [0, 0.0, 0])
+            total[0] += stat['points']; total[1] += stat['co2']; total[2] += stat['tasks']
+        tasks += stat['tasks']
+    # El total histórico sigue a los perfiles (incluye ajustes manuales del admin)
+    profile = Profile.objects.filter(user_id=user_id).values('points', 'co2_saved').first() or {'points': 0, 'co2_saved': 0.0}
+    periods['all'] = [profile['points'], profile['co2_saved'], tasks]
+    subtract(GlobalDailyStat, 'date', days)
+    subtract(GlobalStat, 'period', periods)
+
+
+def daily_totals_query(start, end, user_id=None):
+    if user_id is None:
+        qs = GlobalDailyStat.objects.all()
+    else:
+        qs = DailyStat.objects.filter(user_id=user_id)
+    return qs.filter(date__gte=start, date__lte=end).values('date', 'points', 'co2', 'tasks')
+
+
+def daily_totals(start, end, user_id=None):
+    """Devuelve {fecha: fila} del rollup para el rango [start, end] (ambos incluidos)."""
+    return {r['date']: r for r in daily_totals_query(start, end, user_id)}
+
+
+async def adaily_totals(start, end, user_id=None):
+    """Versión async de daily_totals (ORM async, para las vistas ASGI)."""
+    return {r['date']: r async for r in daily_totals_query(start, end, user_id)}
+
+
+def local_day_bounds(start, end):
+    """Rango semiabierto [medianoche local de start, medianoche local del día siguiente a end).
+
+    Filtrar con completed_at__gte/__lt usa el índice de completed_at; completed_at__date no.
+    """
+    return (timezone.make_aware(datetime.combine(start, time.min)),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+
+
+def aggregate_history(queryset):
+    """Agrupa completaciones por (usuario, día local) directamente en la BD."""
+    return (queryset
+            .annotate(day=TruncDate('completed_at'))
+            .values('user_id', 'day')
+            .annotate(points=Sum('task__points'), tasks=Count('id'))
+            .order_by())
+
+
+def rebuild_user_rollups(user_ids, since=None):
+    """Recalcula desde UserTask los rollups de un lote de usuarios (opcionalmente desde una fecha).
+
+    Los días anteriores al horizonte del archivo (archive_completions) se conservan: ya no están en UserTask.
+    """
+    horizon = ArchiveCheckpoint.objects.values_list('horizon', flat=True).first()
+    if horizon and (since is None or since < horizon):
+        since = horizon
+    history = UserTask.objects.filter(user_id__in=user_ids)
+    stats = DailyStat.objects.filter(user_id__in=user_ids)
+    if since:
+        history = history.filter(completed_at__gte=local_day_bounds(since, since)[0])
+        stats = stats.filter(date__gte=since)
+    rows = aggregate_history(history)
+    stats.delete()
+    DailyStat.objects.bulk_create([
+        DailyStat(user_id=r['user_id'], date=r['day'], points=r['points'],
+                  co2=r['points'] * CO2_PER_POINT, tasks=r['tasks'])
+        for r in rows
+    ])
+    return len(rows)
+
+
+def rebuild_global_rollups(since=None):
+    """Recalcula el rollup global a partir de los rollups por usuario."""
+    stats, days = DailyStat.objects.all(), GlobalDailyStat.objects.all()
+    if since:
+        stats, days = stats.filter(date__gte=since), days.filter(date__gte=since)
+    rows = (stats.values('date')
+            .annotate(points=Sum('points'), co2=Sum('co2'), tasks=Sum('tasks'))
+            .order_by())
+    days.delete()
+    GlobalDailyStat.objects.bulk_create([GlobalDailyStat(**r) for r in rows])
+    return len(rows)
+
+
+def compute_global_stats():
+    """Calcula GlobalStat desde la fuente: perfiles para el total, UserTask (más lo archivado) para años y meses."""
+    stats = {}
+    months = list(UserTask.objects.annotate(month=TruncMonth('completed_at'))
+                  .values('month').annotate(points=Sum('task__points'), tasks=Count('id')).order_by())
+    months += ArchivedMonth.objects.values('month').annotate(points=Sum('points'), tasks=Sum('tasks')).order_by()
+    for row in months:
+        # TruncMonth trunca en la zona horaria local (la misma que usa record_completion)
+        for period in stat_periods(row['month'])[1:]:
+            total = stats.setdefault(period, [0, 0.0, 0])
+            total[0] += row['points']; total[1] += row['points'] * CO2_PER_POINT; total[2] += row['tasks']
+    totals = Profile.objects.aggregate(points=Sum('points'), co2=Sum('co2_saved'))
+    archived = ArchivedMonth.objects.aggregate(tasks=Sum('tasks'))['tasks'] or 0
+    stats['all'] = [totals['points'] or 0, totals['co2'] or 0.0, UserTask.objects.count() + archived]
+    return {period: tuple(values) for period, values in stats.items()}
+
+
+def snapshot_reads():
+    """Llamar al abrir la transacción externa: en PostgreSQL sus lecturas ven una sola instantánea (REPEATABLE READ).
+
+    SQLite ya lee una instantánea por transacción. Dentro de una transacción anidada no se cambia nada.
+    """
+    if connection.vendor == 'postgresql' and len(connection.atomic_blocks) == 1:
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+
+def rebuild_global_stats(dry_run=False):
+    """Corrige la deriva de GlobalStat. Devuelve {period: (guardado, calculado)} de las filas que difieren.
+
+    Sin bloqueos mientras se calcula: lo guardado y lo calculado se leen en una misma instantánea, y la diferencia
+    se aplica como incremento atómico, así las completaciones concurrentes siguen escribiendo y no se pierden.
+    """
+    with transaction.atomic():
+        snapshot_reads()
+        stored = {s.period: (s.points, s.co2, s.tasks) for s in GlobalStat.objects.all()}
+        fresh = compute_global_stats()
+    drift = {}
+    for period in stored.keys() | fresh.keys():
+        old = stored.get(period)
+        old = old and (old[0], round(old[1], 2), old[2])
+        new = fresh.get(period, (0, 0.0, 0))
+        if old != (new[0], round(new[1], 2), new[2]):
+            drift[period] = (old, new)
+    if drift and not dry_run:
+        with transaction.atomic():
+            GlobalStat.objects.filter(period__in=stored.keys() - fresh.keys()).delete()
+            for period in fresh.keys() & drift.keys():
+                old = stored.get(period, (0, 0.0, 0))
+                increment(GlobalStat, {'period': period}, *(n - o for n, o in zip(fresh[period], old)))
+    return drift
@@ -13,6 +13,12 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'profile']
 
+def user_payload(user):
+    """Mismo JSON que UserSerializer(user).data, sin instanciar serializers (GET /api/profile/)."""
+    profile = getattr(user, 'profile', None)
+    return {'id': user.id, 'username': user.username, 'email': user.email, 'first_name': user.first_name,
+            'profile': {'points': profile.points, 'co2_saved': profile.co2_saved, 'level': profile.level} if profile else None}
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -21,4 +27,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+# Columnas de TaskSerializer (fields='__all__', en el orden del modelo) para proyectar con .values()
+TASK_FIELDS = [f.name for f in Task._meta.concrete_fields]
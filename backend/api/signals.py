@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+
+from .models import Level, Profile, Task
+from .catalog import bump_catalog_version
+from .dashboard import tasks_changed
+from .leaderboard import profile_saved, user_saved
+from .levels import levels_changed
+
+# Cualquier alta, edición o borrado de tareas invalida el catálogo cacheado
+post_save.connect(bump_catalog_version, sender=Task, dispatch_uid='task_catalog_save')
+post_delete.connect(bump_catalog_version, sender=Task, dispatch_uid='task_catalog_delete')
+# ...y el historial cacheado en los dashboards (muestra título y puntos de cada tarea)
+post_save.connect(tasks_changed, sender=Task, dispatch_uid='task_dashboard_save')
+post_delete.connect(tasks_changed, sender=Task, dispatch_uid='task_dashboard_delete')
+
+# Cambiar los umbrales recalcula el nivel de todos los perfiles
+post_save.connect(levels_changed, sender=Level, dispatch_uid='level_save')
+post_delete.connect(levels_changed, sender=Level, dispatch_uid='level_delete')
+
+# El ranking sigue a los registros y cambios de staff (los borrados lo quitan explícitamente, sin señal de User)
+post_save.connect(profile_saved, sender=Profile, dispatch_uid='profile_leaderboard_save')
+post_save.connect(user_saved, sender=User, dispatch_uid='user_leaderboard_save')
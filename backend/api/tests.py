@@ -1,3 +1,1214 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocMemBackend
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+import gzip
+import json
+import pickle
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin import site as admin_site
+from .admin import ProfileAdmin
+from .models import (Profile, Level, Task, UserTask, DailyStat, GlobalDailyStat, GlobalStat, OutboundEmail, AdminJob,
+                     ArchiveCheckpoint, ArchivedMonth, ArchivedUserTask)
+from .levels import LevelTable, get_levels, reset_levels
+from .leaderboard import InMemoryLeaderboard, RedisLeaderboard, get_leaderboard, load_rows
+from . import rollups
+from .rollups import (adjust_total, daily_totals, local_day_bounds, rebuild_global_stats, rebuild_user_rollups,
+                      rebuild_global_rollups)
+from .authentication import invalidate_cached_user, user_cache_key
+from .middleware import QueryTracker, metrics
+from .views import find_user_by_email
+from . import async_views
+from .dashboard import dashboard_timeout
+from .jobs import claim_job, run_job
+from .limits import CacheSlidingWindow, InMemorySlidingWindow, get_limiter
+from . import jobs
+from .renderers import FastJSONRenderer, orjson
+from .serializers import TaskSerializer, UserSerializer
+from rest_framework.renderers import JSONRenderer
+from decimal import Decimal
+
+
+def create_user(email='eco@ecopoints.cl', **extra):
+    user = User.objects.create_user(username=email, email=email, password='Eco123456', first_name='Eco', **extra)
+    Profile.objects.create(user=user)
+    return user
+
+
+class CompleteTaskTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.task = Task.objects.create(title='Reciclar latas', points=60)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_credits_points_and_rollup(self):
+        res = self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['new_points'], 60)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.points, 60)
+        self.assertAlmostEqual(profile.co2_saved, 3.0)
+        self.assertEqual(DailyStat.objects.get(user=self.user).points, 60)
+
+    def test_retry_with_same_idempotency_key_is_not_credited_twice(self):
+        for _ in range(3):
+            res = self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json',
+                                   HTTP_IDEMPOTENCY_KEY='retry-1')
+            self.assertEqual(res.data['new_points'], 60)
+        self.assertEqual(UserTask.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Profile.objects.get(user=self.user).points, 60)
+        self.assertEqual(DailyStat.objects.get(user=self.user).tasks, 1)
+
+    def test_non_string_idempotency_key_is_rejected(self):
+        res = self.client.post('/api/task/complete/', {'task_id': self.task.id, 'idempotency_key': 12345}, format='json')
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id}], 'idempotency_key': 12345},
+                               format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(UserTask.objects.exists())
+
+    def test_requests_without_key_are_independent(self):
+        self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        res = self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        self.assertEqual(res.data['new_points'], 120)
+
+
+class BatchCompletionTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.cans = Task.objects.create(title='Reciclar latas', points=60)
+        self.bag = Task.objects.create(title='Usar bolsas reutilizables', points=20)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, items, **extra):
+        return self.client.post('/api/task/complete/batch/', {'items': items}, format='json', **extra)
+
+    def test_credits_whole_batch(self):
+        res = self.post([{'task_id': self.cans.id, 'quantity': 3}, {'task_id': self.bag.id}])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['completed'], res.data['new_points']), (4, 200))
+        self.assertEqual(UserTask.objects.filter(user=self.user).count(), 4)
+        self.assertAlmostEqual(Profile.objects.get(user=self.user).co2_saved, 10.0)
+        stat = DailyStat.objects.get(user=self.user)
+        self.assertEqual((stat.points, stat.tasks), (200, 4))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        self.post([{'task_id': self.bag.id}])
+        counts = []
+        for quantity in (1, 10):
+            with CaptureQueriesContext(connection) as ctx:
+                self.post([{'task_id': self.cans.id, 'quantity': quantity}, {'task_id': self.bag.id}])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_task_rejects_whole_batch(self):
+        res = self.post([{'task_id': self.cans.id}, {'task_id': 999}])
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(res.data['task_ids'], [999])
+        self.assertFalse(UserTask.objects.exists())
+
+    def test_invalid_items(self):
+        for items in (None, [], [{'quantity': 1}], [{'task_id': self.cans.id, 'quantity': 0}],
+                      [{'task_id': self.cans.id, 'quantity': 101}]):
+            with self.subTest(items=items):
+                self.assertEqual(self.post(items).status_code, 400)
+
+    def test_account_without_profile_gets_400(self):
+        admin = User.objects.create_superuser('root@ecopoints.cl', 'root@ecopoints.cl', 'x')
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.post([{'task_id': self.cans.id}]).status_code, 400)
+        self.assertEqual(self.client.post('/api/task/complete/', {'task_id': self.cans.id}, format='json').status_code, 400)
+        self.assertFalse(UserTask.objects.exists())
+
+    def test_retried_batch_is_not_credited_twice(self):
+        for _ in range(2):
+            res = self.post([{'task_id': self.cans.id, 'quantity': 2}], HTTP_IDEMPOTENCY_KEY='punto-limpio-1')
+            self.assertEqual(res.data['new_points'], 120)
+        self.assertEqual(UserTask.objects.filter(user=self.user).count(), 2)
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'SQLite en memoria bloquea escrituras concurrentes entre hilos')
+class ConcurrentCompletionTests(TransactionTestCase):
+    threads = 8
+    requests_per_thread = 10
+
+    def test_concurrent_completions_lose_no_points(self):
+        user = create_user()
+        task = Task.objects.create(title='Reciclar botellas', points=10)
+
+        def worker(_):
+            client = APIClient()
+            client.force_authenticate(User.objects.get(id=user.id))
+            try:
+                return [client.post('/api/task/complete/', {'task_id': task.id}, format='json').status_code
+                        for _ in range(self.requests_per_thread)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            codes = [c for batch in pool.map(worker, range(self.threads)) for c in batch]
+
+        total = self.threads * self.requests_per_thread
+        self.assertEqual(codes, [200] * total)
+        self.assertEqual(Profile.objects.get(user=user).points, total * task.points)
+        self.assertEqual(UserTask.objects.filter(user=user).count(), total)
+
+
+class AdminUserListingTests(TestCase):
+    def setUp(self):
+        self.admin = create_user('admin@ecopoints.cl', is_staff=True)
+        for i in range(5):
+            create_user(f'user{i}@ecopoints.cl')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_walks_every_user_once(self):
+        seen, cursor = [], None
+        while True:
+            res = self.client.get('/api/admin/users/', {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            seen += [u['id'] for u in res.data]
+            cursor = res.get('X-Next-Cursor')
+            if not cursor: break
+        self.assertEqual(sorted(seen), sorted(User.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_search_and_streaming_export(self):
+        res = self.client.get('/api/admin/users/', {'q': 'user3'})
+        self.assertEqual([u['email'] for u in res.data], ['user3@ecopoints.cl'])
+        res = self.client.get('/api/admin/users/', {'export': 'ndjson'})
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        res = self.client.get('/api/admin/users/', {'export': 'csv', 'q': 'admin'})
+        self.assertEqual(len(b''.join(res.streaming_content).decode().splitlines()), 2)
+
+    @override_settings(ASYNC_API=True)
+    def test_export_streams_with_an_async_iterator_under_asgi(self):
+        # Un generador sync se consumiría entero (sync_to_async(list)) antes de enviar el primer byte
+        res = self.client.get('/api/admin/users/', {'export': 'ndjson'})
+        self.assertTrue(res.is_async)
+
+        async def consume():
+            return [chunk async for chunk in res.streaming_content]
+        with mock.patch('api.views.EXPORT_CHUNK', 2):
+            chunks = async_to_sync(consume)()
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(b''.join(chunks).decode().splitlines()), 6)
+
+
+class SlidingWindowMixin:
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        patcher = mock.patch('api.limits.time', monotonic=lambda: self.now, time=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cooldown_allows_one_per_window(self):
+        self.assertTrue(self.limiter.allow('cd:1:1', 1, 60))
+        self.assertFalse(self.limiter.allow('cd:1:1', 1, 60))
+        self.assertTrue(self.limiter.allow('cd:2:1', 1, 60))
+
+    def test_cap_slides_instead_of_resetting(self):
+        for _ in range(3):
+            self.assertTrue(self.limiter.allow('day:1:1', 4, 100))
+        self.assertFalse(self.limiter.allow('day:1:1', 4, 100, amount=2))
+        self.assertTrue(self.limiter.allow('day:1:1', 4, 100))
+        self.assertFalse(self.limiter.allow('day:1:1', 4, 100))
+        self.now += 200
+        self.assertTrue(self.limiter.allow('day:1:1', 4, 100, amount=4))
+
+    def test_release_gives_the_slot_back(self):
+        self.assertTrue(self.limiter.allow('cd:1:1', 1, 60))
+        self.limiter.release('cd:1:1', 1, 60)
+        self.assertTrue(self.limiter.allow('cd:1:1', 1, 60))
+        self.assertTrue(self.limiter.allow('day:1:1', 2, 100, amount=2))
+        self.limiter.release('day:1:1', 2, 100)
+        self.assertTrue(self.limiter.allow('day:1:1', 2, 100))
+        self.assertFalse(self.limiter.allow('day:1:1', 2, 100))
+
+
+class InMemorySlidingWindowTests(SlidingWindowMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.limiter = InMemorySlidingWindow()
+
+
+class CacheSlidingWindowTests(SlidingWindowMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.limiter = CacheSlidingWindow()
+
+    def test_cooldown_expires(self):
+        # La marca de enfriamiento vive en la caché con el timeout de la ventana
+        self.assertTrue(self.limiter.allow('cd:1:1', 1, 60))
+        cache.delete('limit:cd:1:1')
+        self.assertTrue(self.limiter.allow('cd:1:1', 1, 60))
+
+    def test_bucket_evicted_between_add_and_incr_counts_as_new(self):
+        add, calls = cache.add, []
+
+        def evicted_add(*args, **kwargs):
+            # El primer add "encuentra" la cubeta, que desaparece antes del incr
+            calls.append(args)
+            return False if len(calls) == 1 else add(*args, **kwargs)
+
+        with mock.patch.object(cache, 'add', evicted_add):
+            self.assertTrue(self.limiter.allow('day:1:1', 2, 100))
+        self.assertTrue(self.limiter.allow('day:1:1', 2, 100))
+        self.assertFalse(self.limiter.allow('day:1:1', 2, 100))
+
+
+class CompletionLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_limiter.cache_clear()
+        self.user = create_user()
+        self.task = Task.objects.create(title='Usar bolsas reutilizables', points=20, cooldown_seconds=3600, daily_limit=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        get_limiter.cache_clear()
+
+    def test_spam_is_rejected_before_touching_the_database(self):
+        self.assertEqual(self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json').status_code, 200)
+        with self.assertNumQueries(0):
+            res = self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(UserTask.objects.count(), 1)
+        self.assertEqual(Profile.objects.get(user=self.user).points, 20)
+
+    def test_retry_of_registered_completion_is_not_throttled(self):
+        for _ in range(2):
+            res = self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+            self.assertEqual((res.status_code, res.data['new_points']), (200, 20))
+
+    def test_batch_respects_daily_limit(self):
+        Task.objects.filter(id=self.task.id).update(cooldown_seconds=0)
+        res = self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id, 'quantity': 3}]}, format='json')
+        self.assertEqual((res.status_code, res.data['task_id']), (429, self.task.id))
+        res = self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id, 'quantity': 2}]}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json').status_code, 429)
+
+    def test_writes_that_do_not_happen_give_the_slot_back(self):
+        Task.objects.filter(id=self.task.id).update(cooldown_seconds=0)
+        post = lambda **extra: self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json', **extra)
+        self.assertEqual(post(HTTP_IDEMPOTENCY_KEY='k1').status_code, 200)
+        # Reintento idempotente y lote rechazado por una tarea inexistente: no escriben, no gastan cupo
+        self.assertEqual(post(HTTP_IDEMPOTENCY_KEY='k1').status_code, 200)
+        res = self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id}, {'task_id': 999}]},
+                               format='json')
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(post().status_code, 200)
+        self.assertEqual(post().status_code, 429)
+
+    @override_settings(COMPLETION_LIMITS_ENABLED=False)
+    def test_can_be_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json').status_code, 200)
+
+
+class AdminBulkUsersTests(TestCase):
+    def setUp(self):
+        get_leaderboard.cache_clear()
+        self.admin = create_user('admin@ecopoints.cl', is_staff=True)
+        self.users = [create_user(f'user{i}@ecopoints.cl') for i in range(4)]
+        self.ids = [u.id for u in self.users]
+        task = Task.objects.create(title='Reciclar latas', points=60)
+        self.client = APIClient()
+        for user in self.users[:2]:
+            self.client.force_authenticate(user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/task/complete/batch/', {'items': [{'task_id': task.id, 'quantity': 3}]}, format='json')
+        self.client.force_authenticate(self.admin)
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    def test_activation_is_a_single_update(self):
+        User.objects.filter(id=self.ids[0]).update(is_active=False)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post('/api/admin/users/bulk/', {'user_ids': self.ids + [self.admin.id]}, format='json')
+        self.assertEqual(res.data['updated'], 4)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 1)
+        self.assertEqual(dict(User.objects.filter(id__in=self.ids).values_list('id', 'is_active')),
+                         {self.ids[0]: True, self.ids[1]: False, self.ids[2]: False, self.ids[3]: False})
+        self.assertTrue(User.objects.get(id=self.admin.id).is_active)
+        self.client.post('/api/admin/users/bulk/', {'user_ids': self.ids, 'is_active': True}, format='json')
+        self.assertEqual(User.objects.filter(id__in=self.ids, is_active=True).count(), 4)
+        self.assertEqual(self.client.post('/api/admin/users/bulk/', {'user_ids': 'x'}, format='json').status_code, 400)
+
+    def test_delete_job_removes_users_in_chunks_and_keeps_totals(self):
+        res = self.client.delete('/api/admin/users/bulk/', {'user_ids': self.ids[1:] + [self.admin.id]}, format='json')
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res.data['job']['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_job_worker', '--once', '--chunk-size', '2', '--batch-size', '2', stdout=StringIO())
+        job = self.client.get(f"/api/admin/jobs/{res.data['job']['id']}/").data
+        self.assertEqual((job['status'], job['processed']), ('done', 3))
+        self.assertEqual(set(User.objects.values_list('id', flat=True)), {self.admin.id, self.ids[0]})
+        self.assertEqual(UserTask.objects.count(), 3)
+        self.assertEqual(GlobalStat.objects.get(period='all').points, 180)
+        self.assertEqual(rebuild_global_stats(dry_run=True), {})
+
+    def test_interrupted_job_resumes_without_discounting_twice(self):
+        job = AdminJob.objects.create(kind='delete_users', payload={'user_ids': self.ids[:2]}, total=2)
+        real_delete = jobs.raw_delete
+
+        def crash_on_profiles(model, *args, **kwargs):
+            if model is Profile: raise RuntimeError('worker caído')
+            return real_delete(model, *args, **kwargs)
+
+        # Falla al final del grupo: rollups descontados e historial ya borrado, usuarios aún presentes
+        with mock.patch('api.jobs.raw_delete', side_effect=crash_on_profiles):
+            run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.last_error), ('failed', 0, 'worker caído'))
+        self.assertEqual(User.objects.filter(id__in=self.ids[:2], is_active=False).count(), 2)
+        AdminJob.objects.filter(id=job.id).update(status='pending')
+        run_job(claim_job())
+        self.assertEqual(AdminJob.objects.get(id=job.id).status, 'done')
+        self.assertFalse(User.objects.filter(id__in=self.ids[:2]).exists())
+        self.assertEqual(GlobalStat.objects.get(period='all').points, 0)
+        self.assertEqual(rebuild_global_stats(dry_run=True), {})
+
+
+class GlobalStatTests(TestCase):
+    def setUp(self):
+        get_leaderboard.cache_clear()
+        self.admin = create_user('admin@ecopoints.cl', is_staff=True)
+        self.user = create_user()
+        self.task = Task.objects.create(title='Reciclar latas', points=60)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id, 'quantity': 2}]}, format='json')
+        self.client.force_authenticate(self.admin)
+        self.today = timezone.localdate()
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    def stats(self):
+        return {s.period: (s.points, round(s.co2, 2), s.tasks) for s in GlobalStat.objects.all()}
+
+    def test_completion_updates_total_year_and_month(self):
+        expected = (120, 6.0, 2)
+        self.assertEqual(self.stats(), {'all': expected, f'{self.today:%Y}': expected, f'{self.today:%Y-%m}': expected})
+
+    def test_admin_dashboard_reads_precomputed_rows(self):
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/admin/dashboard/')
+        self.assertEqual((res.data['total_points'], res.data['total_co2']), (120, 6.0))
+        self.assertEqual(res.data['monthly'], [{'period': f'{self.today:%Y-%m}', 'points': 120, 'co2': 6.0, 'tasks': 2}])
+        self.assertEqual(res.data['yearly'][0]['points'], 120)
+
+    def test_user_deletion_and_admin_edit_adjust_totals(self):
+        other = create_user('otro@ecopoints.cl')
+        Profile.objects.filter(user=other).update(points=40, co2_saved=2.0)
+        adjust_total(40, 2.0)
+        profile = Profile.objects.get(user=self.user)
+        profile.points = 100
+        with self.captureOnCommitCallbacks(execute=True):
+            ProfileAdmin(Profile, admin_site).save_model(None, profile, None, True)
+        self.assertEqual(self.stats()['all'][0], 140)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/admin/users/{self.user.id}/')
+        self.assertEqual(self.stats(), {'all': (40, 2.0, 0), f'{self.today:%Y}': (0, 0.0, 0), f'{self.today:%Y-%m}': (0, 0.0, 0)})
+        self.assertEqual(rebuild_global_stats(dry_run=True), {})
+
+    def test_reconcile_corrects_drift(self):
+        GlobalStat.objects.filter(period='all').update(points=5)
+        GlobalStat.objects.create(period='1999-01', points=10)
+        out = StringIO()
+        call_command('reconcile_stats', '--dry-run', stdout=out)
+        self.assertIn('2 períodos con deriva', out.getvalue())
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertEqual(self.stats()['all'], (120, 6.0, 2))
+        self.assertNotIn('1999-01', self.stats())
+
+    def test_reconcile_keeps_completions_made_while_computing(self):
+        GlobalStat.objects.filter(period='all').update(points=5)
+        compute = rollups.compute_global_stats
+
+        def compute_while_completing():
+            # Una completación que llega después de la lectura: la corrección no debe pisarla
+            fresh = compute()
+            rollups.record_completion(self.user.id, 30)
+            return fresh
+
+        with mock.patch('api.rollups.compute_global_stats', compute_while_completing):
+            rebuild_global_stats()
+        self.assertEqual(self.stats()['all'][0], 150)
+        self.assertEqual(self.stats()[f'{self.today:%Y-%m}'][:1], (150,))
+
+
+class ArchiveCompletionsTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        task = Task.objects.create(title='Reciclar latas', points=60)
+        # 8 completaciones de hace más de un año (2 meses distintos) y 3 recientes
+        ages = [400, 400, 401, 430, 431, 432, 433, 434, 1, 2, 3]
+        UserTask.objects.bulk_create([UserTask(user=self.user, task=task) for _ in ages])
+        now = timezone.now()
+        for age, ut in zip(ages, UserTask.objects.order_by('id')):
+            UserTask.objects.filter(id=ut.id).update(completed_at=now - timedelta(days=age))
+        Profile.objects.filter(user=self.user).update(points=60 * len(ages), co2_saved=3.0 * len(ages))
+        rebuild_user_rollups([self.user.id])
+        rebuild_global_rollups()
+        rebuild_global_stats()
+
+    def archive(self, *args):
+        call_command('archive_completions', '--older-than', '365', '--batch-size', '3', *args, stdout=StringIO())
+
+    def test_moves_old_rows_and_keeps_totals(self):
+        days = DailyStat.objects.count()
+        self.archive()
+        self.assertEqual(UserTask.objects.count(), 3)
+        self.assertEqual(ArchivedUserTask.objects.count(), 8)
+        self.assertEqual(sum(ArchivedMonth.objects.values_list('points', flat=True)), 480)
+        self.assertLessEqual(ArchivedMonth.objects.count(), 3)
+        self.assertEqual(Profile.objects.get(user=self.user).points, 660)
+        self.assertEqual(rebuild_global_stats(dry_run=True), {})
+        # Reconstruir los rollups no borra los días archivados
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(DailyStat.objects.count(), days)
+        # Volver a correrlo no hace nada
+        self.archive()
+        self.assertEqual(ArchivedUserTask.objects.count(), 8)
+
+    def test_ndjson_batches_are_resumable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.archive('--ndjson-dir', directory, '--max-batches', '1')
+            self.assertEqual(UserTask.objects.count(), 8)
+            self.archive('--ndjson-dir', directory)
+            rows = [json.loads(line) for path in Path(directory).glob('*.ndjson.gz')
+                    for line in gzip.open(path, 'rt', encoding='utf-8')]
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(len({r['id'] for r in rows}), 8)
+        self.assertFalse(ArchivedUserTask.objects.exists())
+        self.assertEqual(rebuild_global_stats(dry_run=True), {})
+
+    @override_settings(IDEMPOTENCY_RETRY_DAYS=30)
+    def test_refuses_to_archive_inside_the_retry_window(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_completions', '--older-than', '7', stdout=StringIO())
+        self.assertFalse(ArchivedUserTask.objects.exists())
+
+
+class LevelTests(TestCase):
+    def setUp(self):
+        reset_levels()
+        self.user = create_user()
+        self.task = Task.objects.create(title='Llevar ropa a punto limpio', points=400)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        reset_levels()
+
+    def test_table_lookup(self):
+        table = LevelTable([(1000, 'Plata'), (0, 'Bronce'), (3000, 'Oro')])
+        self.assertEqual([table.name(p) for p in (0, 999, 1000, 50000)], ['Bronce', 'Bronce', 'Plata', 'Oro'])
+        self.assertEqual([table.progress(p) for p in (0, 500, 2000, 3000)], [0, 50, 50, 100])
+        self.assertTrue(table.crossed(900, 1000))
+        self.assertFalse(table.crossed(1000, 2999))
+        self.assertEqual(LevelTable([]).name(10), 'Eco-Iniciado')
+
+    def test_completion_promotes_only_when_crossing_threshold(self):
+        self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_levels().name(400), 'Eco-Iniciado')
+        res = self.client.post('/api/task/complete/batch/', {'items': [{'task_id': self.task.id, 'quantity': 2}]}, format='json')
+        self.assertEqual(res.data['new_points'], 1200)
+        self.assertEqual(Profile.objects.get(user=self.user).level, 'Eco-Aprendiz')
+        res = self.client.get('/api/dashboard/')
+        self.assertEqual((res.data['level'], res.data['progress']), ('Eco-Aprendiz', 13))
+
+    def test_threshold_change_recomputes_profiles(self):
+        Profile.objects.filter(user=self.user).update(points=700)
+        with self.captureOnCommitCallbacks(execute=True):
+            Level.objects.create(name='Eco-Brote', min_points=500)
+        self.assertEqual(Profile.objects.get(user=self.user).level, 'Eco-Brote')
+        staff = create_user('admin@ecopoints.cl', is_staff=True)
+        Profile.objects.filter(user=staff).update(level='Administrador', points=5000)
+        call_command('recompute_levels', stdout=StringIO())
+        self.assertEqual(Profile.objects.get(user=staff).level, 'Administrador')
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_leaderboard.cache_clear()
+        self.user = create_user()
+        self.task = Task.objects.create(title='Reciclar latas', points=60)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    def complete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+
+    def test_repeat_loads_are_served_without_queries(self):
+        self.complete()
+        first = self.client.get('/api/dashboard/').data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/dashboard/').data, first)
+            self.assertEqual(self.client.get('/api/history/').data[0]['points'], 60)
+
+    def test_writes_invalidate_cached_dashboard(self):
+        self.client.get('/api/dashboard/')
+        self.complete()
+        self.assertEqual(self.client.get('/api/dashboard/').data['points'], 60)
+        self.assertEqual(len(self.client.get('/api/history/').data), 1)
+        self.client.put('/api/profile/', {'first_name': 'Eco 2'}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/dashboard/')
+        self.assertTrue(ctx.captured_queries)
+        # Cambio de título de una tarea: invalida el historial de todos
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'Latas'
+            self.task.save()
+        self.assertEqual(self.client.get('/api/history/').data[0]['title'], 'Latas')
+
+    def test_expires_at_local_day_rollover(self):
+        self.assertLessEqual(dashboard_timeout(), 24 * 3600)
+        self.client.get('/api/dashboard/')
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('api.dashboard.timezone.localdate', return_value=tomorrow):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/api/dashboard/')
+        self.assertTrue(ctx.captured_queries)
+
+
+class UserHistoryTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        task = Task.objects.create(title='Reciclar cartón', points=30)
+        now = timezone.now()
+        UserTask.objects.bulk_create([UserTask(user=self.user, task=task) for _ in range(25)])
+        # Repartir las completaciones en 25 días hacia atrás
+        for i, ut in enumerate(UserTask.objects.filter(user=self.user).order_by('id')):
+            UserTask.objects.filter(id=ut.id).update(completed_at=now - timedelta(days=i))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_page_keeps_last_ten(self):
+        res = self.client.get('/api/history/')
+        self.assertEqual(len(res.data), 10)
+        self.assertEqual(set(res.data[0]), {'title', 'points', 'date'})
+        self.assertIn('X-Next-Cursor', res)
+
+    def test_cursor_pages_cover_full_history(self):
+        total, cursor = 0, None
+        while True:
+            res = self.client.get('/api/history/', {'limit': 7, **({'cursor': cursor} if cursor else {})})
+            total += len(res.data)
+            cursor = res.get('X-Next-Cursor')
+            if not cursor: break
+        self.assertEqual(total, 25)
+
+    def test_account_without_profile_gets_its_history(self):
+        # createsuperuser / staff creado en el admin: sin Profile
+        staff = User.objects.create_user(username='staff@ecopoints.cl', email='staff@ecopoints.cl', password='x', is_staff=True)
+        UserTask.objects.create(user=staff, task=Task.objects.first())
+        self.client.force_authenticate(staff)
+        res = self.client.get('/api/history/')
+        self.assertEqual((res.status_code, len(res.data)), (200, 1))
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 400)
+        token = str(RefreshToken.for_user(staff).access_token)
+        response = async_to_sync(async_views.get_user_history)(
+            AsyncRequestFactory().get('/api/history/', headers={'Authorization': f'Bearer {token}'}))
+        self.assertEqual(response.content, res.content)
+
+    def test_date_range_filter(self):
+        today = timezone.localdate()
+        res = self.client.get('/api/history/', {'from': str(today - timedelta(days=4)), 'to': str(today), 'limit': 100})
+        self.assertEqual(len(res.data), 5)
+        self.assertEqual(self.client.get('/api/history/', {'from': 'ayer'}).status_code, 400)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.admin = create_user('admin@ecopoints.cl', is_staff=True)
+        glass = Task.objects.create(title='Reciclar vidrio', points=40, icon_type='glass')
+        can = Task.objects.create(title='Reciclar latas', points=10, icon_type='can')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for task in (glass, glass, can):
+                self.client.post('/api/task/complete/', {'task_id': task.id}, format='json')
+
+    def test_daily_series_from_rollups(self):
+        res = self.client.get('/api/analytics/', {'range': 30})
+        self.assertEqual(len(res.data['series']), 30)
+        self.assertEqual(res.data['series'][-1], {'period': str(timezone.localdate()), 'points': 90, 'co2': 4.5, 'tasks': 3})
+        self.assertEqual(sum(b['points'] for b in res.data['series']), 90)
+
+    def test_monthly_breakdown_by_icon(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.get('/api/admin/analytics/', {'range': 365, 'granularity': 'month', 'group_by': 'icon_type'})
+        self.assertLessEqual(len(res.data['series']), 13)
+        last = res.data['series'][-1]
+        self.assertEqual(last['period'], str(timezone.localdate().replace(day=1)))
+        self.assertEqual(last['groups'], {'glass': {'points': 80, 'co2': 4.0, 'tasks': 2},
+                                          'can': {'points': 10, 'co2': 0.5, 'tasks': 1}})
+
+    def test_cached_per_parameters_and_invalidated_by_completion(self):
+        self.client.get('/api/analytics/', {'granularity': 'week'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/analytics/', {'granularity': 'week'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/task/complete/', {'task_id': Task.objects.first().id}, format='json')
+        self.assertEqual(self.client.get('/api/analytics/', {'granularity': 'week'}).data['series'][-1]['points'], 130)
+
+    def test_breakdown_starts_at_the_archive_horizon(self):
+        horizon = timezone.localdate() - timedelta(days=10)
+        ArchiveCheckpoint.objects.create(horizon=horizon)
+        res = self.client.get('/api/analytics/', {'range': 30, 'group_by': 'icon_type'})
+        self.assertEqual((res.data['from'], res.data['archived_before']), (str(horizon), str(horizon)))
+        self.assertEqual((len(res.data['series']), res.data['series'][-1]['points']), (11, 90))
+        self.assertIsNone(self.client.get('/api/analytics/', {'range': 30}).data['archived_before'])
+        res = self.client.get('/api/analytics/', {'to': str(horizon - timedelta(days=1)), 'group_by': 'icon_type'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_rejects_invalid_or_unbounded_ranges(self):
+        for params in ({'range': 400}, {'range': 100000000}, {'range': 30, 'to': '0001-01-05'},
+                       {'from': '9999-12-01', 'to': '9999-12-31', 'granularity': 'month'}, {'granularity': 'hour'},
+                       {'group_by': 'user'}, {'from': 'ayer'}):
+            self.assertEqual(self.client.get('/api/analytics/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/analytics/').status_code, 403)
+
+
+class FailingEmailBackend(LocMemBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP caído')
+
+
+class MailQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def register(self):
+        return APIClient().post('/api/register/', {'email': 'Nuevo@EcoPoints.cl', 'password': 'x', 'name': 'Nuevo'}, format='json')
+
+    def test_registration_queues_and_worker_sends(self):
+        self.assertEqual(self.register().status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, 'pending')
+
+        call_command('run_mail_worker', once=True, rate=0, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['nuevo@ecopoints.cl'])
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        self.register()
+        call_command('run_mail_worker', once=True, rate=0, max_attempts=2, stdout=StringIO())
+        outbound = OutboundEmail.objects.get()
+        self.assertEqual((outbound.status, outbound.attempts), ('pending', 1))
+        self.assertGreater(outbound.next_attempt_at, timezone.now())
+        self.assertIn('SMTP caído', outbound.last_error)
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        call_command('run_mail_worker', once=True, rate=0, max_attempts=2, stdout=StringIO())
+        self.assertEqual(OutboundEmail.objects.get().status, 'failed')
+
+
+class MailWorkerTransactionTests(TransactionTestCase):
+    # Sin la transacción envolvente de TestCase: se comprueba que el envío ocurre fuera de toda transacción
+    def setUp(self):
+        cache.clear()
+
+    register = MailQueueTests.register
+
+    def test_sends_outside_a_transaction_under_a_lease(self):
+        self.register()
+        seen = []
+
+        def send(backend, messages):
+            # Mientras se envía no hay transacción abierta y el correo está arrendado (no lo toma otro worker)
+            seen.append((connection.in_atomic_block, OutboundEmail.objects.get().next_attempt_at > timezone.now()))
+            return len(messages)
+
+        with mock.patch.object(LocMemBackend, 'send_messages', send):
+            call_command('run_mail_worker', once=True, rate=0, stdout=StringIO())
+        self.assertEqual(seen, [(False, True)])
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+
+class TaskCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Task.objects.create(title='Reciclar botellas', points=10, icon_type='plastic')
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def test_conditional_get_skips_database(self):
+        first = self.client.get('/api/tasks/')
+        self.assertEqual(len(first.data), 1)
+        with self.assertNumQueries(0):
+            again = self.client.get('/api/tasks/')
+            not_modified = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_task_changes_bump_version(self):
+        etag = self.client.get('/api/tasks/')['ETag']
+        Task.objects.create(title='Usar bolsa', points=5, icon_type='bag')
+        res = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data), 2)
+        self.assertNotEqual(res['ETag'], etag)
+
+
+@override_settings(API_METRICS_ENABLED=True)
+class FastJSONTests(TestCase):
+    """Proyecciones y renderer rápido: deben producir exactamente los mismos bytes que DRF."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        Task.objects.create(title='Reciclar cartón ñ', points=30, icon_type='box')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @unittest.skipIf(orjson is None, 'orjson no está instalado')
+    def test_renderer_is_byte_compatible(self):
+        data = {'nombre': 'Ñandú 🌿', 'sep': 'a\u2028b\u2029', 'co2': 3.0000000000000004, 'n': None, 1: True,
+                'cuando': timezone.now(), 'dia': timezone.localdate(), 'monto': Decimal('1.50'), 'lista': [1.5, 'x']}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_projections_match_serializers(self):
+        user = User.objects.select_related('profile').get(id=self.user.id)
+        self.assertEqual(self.client.get('/api/profile/').content, JSONRenderer().render(UserSerializer(user).data))
+        self.assertEqual(self.client.get('/api/tasks/').content,
+                         JSONRenderer().render(TaskSerializer(Task.objects.all(), many=True).data))
+
+    def test_fast_renderer_serves_same_bytes(self):
+        expected = [self.client.get(path).content for path in ('/api/profile/', '/api/tasks/')]
+        # FAST_JSON=1 cambia DEFAULT_RENDERER_CLASSES, que DRF lee al importar las vistas
+        with mock.patch('rest_framework.views.APIView.renderer_classes', [FastJSONRenderer]):
+            self.assertEqual([self.client.get(path).content for path in ('/api/profile/', '/api/tasks/')], expected)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('admin@ecopoints.cl', is_staff=True))
+
+    def test_server_timing_and_admin_metrics(self):
+        res = self.client.get('/api/history/?limit=10')
+        self.assertIn('db;dur=', res['Server-Timing'])
+        views = self.client.get('/api/admin/metrics/').data['views']
+        self.assertEqual(views['api/history/']['requests'], 1)
+        self.assertEqual(views['api/history/']['mean_queries'], 1)
+        self.assertEqual(sum(views['api/history/']['histogram'].values()), 1)
+
+    def test_repeated_sql_is_flagged(self):
+        tracker = QueryTracker()
+        with connection.execute_wrapper(tracker):
+            for _ in range(3):
+                list(Task.objects.filter(id=1))
+        self.assertEqual(list(tracker.repeated(3).values()), [3])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.admin = create_user('admin@ecopoints.cl', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        get_leaderboard.cache_clear()
+        get_leaderboard().count()  # Ranking ya cargado: solo se miden las consultas de autenticación
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    def test_user_and_profile_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/ranking/me/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/ranking/me/').data['points'], 0)
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.client.get('/api/ranking/me/')
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        admin.put('/api/admin/users/', {'user_id': self.user.id}, format='json')
+        self.assertEqual(self.client.get('/api/ranking/me/').status_code, 401)
+
+    def test_completion_refreshes_cached_points(self):
+        task = Task.objects.create(title='Reciclar latas', points=60)
+        self.client.get('/api/ranking/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/task/complete/', {'task_id': task.id}, format='json')
+        self.assertEqual(self.client.get('/api/ranking/me/').data['points'], 60)
+
+    def test_profile_put_does_not_write_back_stale_cached_user(self):
+        self.client.get('/api/ranking/me/')
+        # Cambios hechos por otro worker: la invalidación no llega a la caché local de este proceso
+        Profile.objects.filter(user=self.user).update(points=500)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.client.put('/api/profile/', {'first_name': 'Nuevo', 'new_password': 'Otra12345'}, format='json')
+        user = User.objects.select_related('profile').get(id=self.user.id)
+        self.assertEqual((user.first_name, user.profile.points, user.is_active), ('Nuevo', 500, False))
+        self.assertTrue(user.check_password('Otra12345'))
+
+    def test_cached_user_has_no_password_hash(self):
+        self.client.get('/api/ranking/me/')
+        cached = cache.get(user_cache_key(self.user.id))
+        password = User.objects.get(id=self.user.id).password
+        self.assertNotIn(password.encode(), pickle.dumps(cached))
+        with self.assertNumQueries(0):
+            self.assertEqual(cached.profile.user.first_name, 'Eco')
+        # Si algo lo necesita, se relee de la BD
+        self.assertEqual(cached.password, password)
+
+    def test_revoke_check_works_from_the_cached_copy(self):
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+            self.assertEqual(self.client.get('/api/ranking/me/').status_code, 200)
+            self.assertNotIn(User.objects.get(id=self.user.id).password.encode(),
+                             pickle.dumps(cache.get(user_cache_key(self.user.id))))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get('/api/ranking/me/').status_code, 200)
+            self.user.set_password('Otra12345')
+            self.user.save()
+            invalidate_cached_user(self.user.id)
+            self.assertEqual(self.client.get('/api/ranking/me/').status_code, 401)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+
+    def login(self, email='ECO@ecopoints.cl', password='Eco123456', ip='10.0.0.1'):
+        return self.client.post('/api/login/', {'email': email, 'password': password}, format='json', REMOTE_ADDR=ip)
+
+    def test_case_insensitive_login(self):
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_legacy_pbkdf2_hash_is_upgraded_on_login(self):
+        User.objects.filter(id=self.user.id).update(
+            password=make_password('Eco123456', hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(id=self.user.id).password.startswith('scrypt$'))
+
+    def test_throttles_per_email_and_per_ip(self):
+        for i in range(10):
+            self.assertEqual(self.login(password='mala', ip=f'10.0.0.{i}').status_code, 401)
+        self.assertEqual(self.login(ip='10.0.0.99').status_code, 429)
+        for i in range(30):
+            self.login(email=f'otro{i}@ecopoints.cl', ip='10.0.1.1')
+        self.assertEqual(self.login(email='nuevo@ecopoints.cl', ip='10.0.1.1').status_code, 429)
+
+    def test_spoofed_forwarded_for_does_not_reset_ip_bucket(self):
+        def last_attempt(num_proxies, forwarded):
+            # 31 contraseñas malas con correos distintos, cada una con otra IP inventada en X-Forwarded-For
+            cache.clear()
+            config = settings.REST_FRAMEWORK if num_proxies is None else {**settings.REST_FRAMEWORK, 'NUM_PROXIES': num_proxies}
+            with override_settings(REST_FRAMEWORK=config):
+                for i in range(31):
+                    res = self.client.post('/api/login/', {'email': f'otro{i}@ecopoints.cl', 'password': 'mala'},
+                                           format='json', REMOTE_ADDR='10.0.2.1', HTTP_X_FORWARDED_FOR=forwarded % i)
+            return res.status_code
+
+        # Sin proxy de confianza (configuración local) la cabecera se ignora; detrás de uno cuenta la IP que agrega el proxy
+        self.assertEqual(last_attempt(None, '203.0.113.%d'), 429)
+        self.assertEqual(last_attempt(1, '203.0.113.%d, 198.51.100.7'), 429)
+
+class FakeRedis:
+    """Subconjunto en memoria de los comandos de sorted set/hash usados por RedisLeaderboard (sin expiración)."""
+
+    def __init__(self):
+        self.zsets, self.hashes, self.strings = {}, {}, {}
+
+    def delete(self, *keys):
+        for key in keys:
+            self.zsets.pop(key, None)
+            self.hashes.pop(key, None)
+            self.strings.pop(key, None)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def rename(self, src, dst):
+        for store in (self.zsets, self.hashes):
+            if src in store:
+                store[dst] = store.pop(src)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def _ordered(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+
+    def zrevrank(self, key, member):
+        members = [m for m, _ in self._ordered(key)]
+        return members.index(member) if member in members else None
+
+    def zrevrange(self, key, start, end, withscores=False):
+        return [(m, float(s)) for m, s in self._ordered(key)[start:end + 1]]
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.hashes.setdefault(key, {})
+        if mapping: h.update(mapping)
+        if field is not None: h[field] = value
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(f) for f in fields]
+
+
+class LeaderboardBackendMixin:
+    def make_board(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.users = [create_user(f'u{i}@ecopoints.cl') for i in range(3)]
+        for user, points in zip(self.users, (50, 300, 120)):
+            Profile.objects.filter(user=user).update(points=points)
+        create_user('staff@ecopoints.cl', is_staff=True)
+        self.board = self.make_board()
+
+    def test_top_is_sorted_and_excludes_staff(self):
+        self.assertEqual([e['points'] for e in self.board.top(0, 10)], [300, 120, 50])
+        self.assertEqual(self.board.count(), 3)
+
+    def test_rank_and_write_through_update(self):
+        self.assertEqual(self.board.rank(self.users[0].id), 3)
+        self.board.update(self.users[0].id, 'Eco', 500)
+        self.assertEqual(self.board.rank(self.users[0].id), 1)
+        self.assertEqual(self.board.top(1, 1)[0]['points'], 300)
+
+    def test_remove(self):
+        self.assertEqual(self.board.count(), 3)
+        user_id = self.users[1].id
+        self.users[1].delete()
+        self.board.remove(user_id)
+        self.assertIsNone(self.board.rank(user_id))
+        self.assertEqual(self.board.count(), 2)
+
+    def test_ties_are_ordered_by_user_id(self):
+        self.board.count()
+        for user in self.users:
+            self.board.update(user.id, user.first_name, 100)
+        self.assertEqual([e['user_id'] for e in self.board.top(0, 3)], [u.id for u in self.users])
+        self.assertEqual([e['points'] for e in self.board.top(0, 3)], [100, 100, 100])
+        self.assertEqual(self.board.rank(self.users[2].id), 3)
+
+
+class InMemoryLeaderboardTests(LeaderboardBackendMixin, TestCase):
+    def make_board(self):
+        return InMemoryLeaderboard()
+
+
+class RedisLeaderboardTests(LeaderboardBackendMixin, TestCase):
+    def make_board(self):
+        return RedisLeaderboard(client=FakeRedis())
+
+    def test_empty_ranking_is_not_reloaded_on_every_read(self):
+        Profile.objects.all().delete()
+        board = self.make_board()
+        self.assertEqual(board.count(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(board.top(0, 10), [])
+            self.assertEqual(board.count(), 0)
+
+    def test_reload_reconciles_deletes_and_staff_changes(self):
+        self.assertEqual(self.board.count(), 3)
+        # Cambios que no pasaron por el write-through: se recogen cuando expira la marca de frescura
+        Profile.objects.filter(user=self.users[0]).delete()
+        User.objects.filter(id=self.users[1].id).update(is_staff=True)
+        self.assertEqual(self.board.count(), 3)
+        self.board.client.delete(self.board.fresh_key)
+        self.assertEqual([e['user_id'] for e in self.board.top(0, 10)], [self.users[2].id])
+
+    def test_registration_and_staff_promotion_write_through(self):
+        board = self.make_board()
+        with mock.patch('api.leaderboard.get_leaderboard', return_value=board), self.captureOnCommitCallbacks(execute=True):
+            res = APIClient().post('/api/register/', {'email': 'nuevo@ecopoints.cl', 'password': 'x', 'name': 'Nuevo'},
+                                   format='json')
+        self.assertEqual(res.status_code, 200)
+        new = User.objects.get(username='nuevo@ecopoints.cl')
+        self.assertEqual((board.rank(new.id), board.count()), (4, 4))
+
+        with mock.patch('api.leaderboard.get_leaderboard', return_value=board), self.captureOnCommitCallbacks(execute=True):
+            new.is_staff = True
+            new.save()
+        self.assertIsNone(board.rank(new.id))
+        self.assertEqual(board.count(), 3)
+
+
+class RankingEndpointTests(TestCase):
+    def setUp(self):
+        get_leaderboard.cache_clear()
+        self.user = create_user()
+        self.task = Task.objects.create(title='Reciclar vidrio', points=40)
+        self.rival = create_user('rival@ecopoints.cl')
+        Profile.objects.filter(user=self.rival).update(points=30)
+        self.client = APIClient()
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    def test_completion_writes_through_to_ranking(self):
+        self.assertEqual(self.client.get('/api/ranking/').data[0]['points'], 30)
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/task/complete/', {'task_id': self.task.id}, format='json')
+        self.assertEqual(self.client.get('/api/ranking/me/').data['rank'], 1)
+        page = self.client.get('/api/ranking/top/?offset=1&limit=1').data
+        self.assertEqual(page['total'], 2)
+        self.assertEqual(page['results'], [{'rank': 2, 'name': 'Eco', 'points': 30}])
+
+
+class AsyncViewsTests(TestCase):
+    """Las vistas ASGI deben responder exactamente lo mismo que las vistas DRF."""
+
+    def setUp(self):
+        get_leaderboard.cache_clear()
+        cache.clear()
+        self.user = create_user()
+        task = Task.objects.create(title='Reciclar vidrio', points=40, icon_type='glass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.client.post('/api/task/complete/', {'task_id': task.id}, format='json')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.factory = AsyncRequestFactory()
+
+    def tearDown(self):
+        get_leaderboard.cache_clear()
+
+    async def test_same_payload_as_drf_views(self):
+        cases = [('/api/dashboard/', async_views.get_dashboard_data), ('/api/tasks/', async_views.get_tasks),
+                 ('/api/ranking/', async_views.get_ranking), ('/api/history/?limit=2', async_views.get_user_history)]
+        for path, view in cases:
+            with self.subTest(path=path):
+                expected = await sync_to_async(self.client.get)(path)
+                response = await view(self.factory.get(path, headers={'Authorization': f'Bearer {self.token}'}))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('X-Next-Cursor'), expected.get('X-Next-Cursor'))
+
+    async def test_cold_level_table_is_loaded_async(self):
+        # Primer request del worker (o tabla vencida): la carga de niveles no puede usar el ORM sync
+        reset_levels()
+        await cache.aclear()
+        for view in (async_views.get_dashboard_data, async_views.get_user_history):
+            response = await view(self.factory.get('/', headers={'Authorization': f'Bearer {self.token}'}))
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]['points'], 40)
+
+    async def test_requires_valid_token(self):
+        response = await async_views.get_dashboard_data(AsyncRequestFactory().get('/api/dashboard/'))
+        self.assertEqual(response.status_code, 401)
+        bad = AsyncRequestFactory().get('/api/dashboard/', headers={'Authorization': 'Bearer x'})
+        self.assertEqual((await async_views.get_dashboard_data(bad)).status_code, 401)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Los planes capturados son de EXPLAIN QUERY PLAN de SQLite')
+class QueryPlanTests(TestCase):
+    """Evita que cambios futuros hagan caer las consultas calientes en recorridos completos."""
+
+    def capture_plans(self, fn):
+        """Ejecuta fn y devuelve el EXPLAIN QUERY PLAN de cada SELECT que lanzó."""
+        calls = []
+
+        def wrapper(execute, sql, params, many, context):
+            calls.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            fn()
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, params in calls:
+                if sql.lstrip().upper().startswith('SELECT'):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    plans.append('\n'.join(row[-1] for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return '\n'.join(plans)
+
+    def assertIndexedPlan(self, plan, table, index=None):
+        lines = [line for line in plan.splitlines() if f' {table} ' in f'{line} ']
+        self.assertTrue(lines, plan)
+        for line in lines:
+            self.assertIn('USING', line, f'Recorrido sin índice:\n{plan}')
+        self.assertNotIn('TEMP B-TREE', plan, f'Ordenamiento sin índice:\n{plan}')
+        if index:
+            self.assertIn(index, plan)
+
+    def test_history_uses_user_recent_index(self):
+        client = APIClient()
+        client.force_authenticate(create_user())
+        plan = self.capture_plans(lambda: client.get('/api/history/?limit=10'))
+        self.assertIndexedPlan(plan, 'api_usertask', 'usertask_user_recent_idx')
+
+    def test_completed_at_range_uses_index(self):
+        today = timezone.localdate()
+        start, end = local_day_bounds(today - timedelta(days=6), today)
+        plan = self.capture_plans(lambda: list(UserTask.objects.filter(completed_at__gte=start, completed_at__lt=end)))
+        self.assertIndexedPlan(plan, 'api_usertask', 'usertask_completed_at_idx')
+
+    def test_chart_reads_rollups_through_indexes(self):
+        today = timezone.localdate()
+        plan = self.capture_plans(lambda: daily_totals(today - timedelta(days=6), today, user_id=1))
+        self.assertIndexedPlan(plan, 'api_dailystat')
+        plan = self.capture_plans(lambda: daily_totals(today - timedelta(days=6), today))
+        self.assertIndexedPlan(plan, 'api_globaldailystat')
+
+    def test_login_lookup_uses_lower_email_index(self):
+        plan = self.capture_plans(lambda: find_user_by_email('Eco@EcoPoints.cl').exists())
+        self.assertIndexedPlan(plan, 'auth_user', 'api_user_email_lower_idx')
+
+    def test_ranking_walks_points_index(self):
+        plan = self.capture_plans(lambda: list(load_rows()[:10]))
+        self.assertIndexedPlan(plan, 'api_profile', 'profile_points_rank_idx')
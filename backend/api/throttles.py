@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+import hashlib
+
+
+class AuthRateThrottle(SimpleRateThrottle):
+    """Throttle en caché para login/registro/recuperación; la tasa sale de AUTH_THROTTLE_RATES.
+
+    Se rechaza antes de tocar la BD o calcular un hash, así el tráfico de fuerza bruta
+    no consume los workers.
+    """
+
+    def get_rate(self):
+        # Sin tasa configurada (p. ej. AUTH_THROTTLE=0 en benchmarks) no se limita
+        return getattr(settings, 'AUTH_THROTTLE_RATES', {}).get(self.scope)
+
+
+class AuthIPThrottle(AuthRateThrottle):
+    scope = 'auth_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class AuthEmailThrottle(AuthRateThrottle):
+    scope = 'auth_email'
+
+    def get_cache_key(self, request, view):
+        email = str(request.data.get('email', '')).strip().lower()
+        if not email:
+            return None
+        ident = hashlib.sha256(email.encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,96 +1,133 @@
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
+from django.contrib.auth.hashers import make_password
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Sum
-from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.db import transaction, IntegrityError
 from django.utils import timezone
 from datetime import timedelta
+import csv
+import itertools
+import json
 import secrets
 import string
-import threading
 
-from .models import Task, Profile, UserTask
-from .serializers import TaskSerializer, UserSerializer, UserUpdateSerializer
-
-# --- UTILIDAD: CORREOS EN SEGUNDO PLANO ---
-class EmailThread(threading.Thread):
-    def __init__(self, subject, message, recipient_list):
-        self.subject = subject
-        self.message = message
-        self.recipient_list = recipient_list
-        threading.Thread.__init__(self)
-
-    def run(self):
-        try:
-            send_mail(self.subject, self.message, None, self.recipient_list, fail_silently=True)
-        except Exception as e:
-            print(f"Error enviando correo en hilo: {e}")
+from .models import Task, Profile, UserTask, GlobalStat, AdminJob
+from .serializers import TaskSerializer, UserUpdateSerializer, user_payload
+from .dashboard import bump_dashboard_version, bump_dashboard_versions, get_dashboard
+from .levels import get_levels, sync_level
+from .rollups import CO2_PER_POINT, record_completion, discount_user, daily_totals, local_day_bounds
+from .leaderboard import get_leaderboard, sync_user
+from .mail import queue_email
+from .catalog import catalog_version, catalog_etag, get_catalog, catalog_index
+from .limits import check_completion, release_completion
+from .middleware import metrics
+from .authentication import invalidate_cached_user, invalidate_cached_users
+from .throttles import AuthIPThrottle, AuthEmailThrottle
+from .pagination import encode_cursor, decode_cursor, page_size, parse_day
+from .analytics import get_analytics
+from .jobs import queue_delete_users, job_payload
 
 # --- UTILIDAD: GENERAR DATOS DE GRÁFICO (Últimos 7 días) ---
-def get_weekly_chart_data(queryset_filter=None):
-    today = timezone.now().date()
+def weekly_window():
+    # Días calculados en la zona horaria local (TIME_ZONE), no en UTC
+    today = timezone.localdate()
     # Generar lista de los últimos 7 días (incluyendo hoy)
-    last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-    
-    chart_data = []
-    
+    return [today - timedelta(days=i) for i in range(6, -1, -1)]
+
+def get_weekly_chart_data(user=None):
+    last_7_days = weekly_window()
+    # Se leen como máximo 7 filas del rollup diario (user=None -> global)
+    totals = daily_totals(last_7_days[0], last_7_days[-1], user_id=user.id if user else None)
+    return format_weekly_chart(last_7_days, totals)
+
+def format_weekly_chart(last_7_days, totals):
     # Nombres de días en español
     days_map = {0: 'Lun', 1: 'Mar', 2: 'Mié', 3: 'Jue', 4: 'Vie', 5: 'Sáb', 6: 'Dom'}
 
+    chart_data = []
     for day in last_7_days:
-        # Filtrar tareas completadas en ese día específico
-        # Nota: completed_at es DateTime, usamos __date para comparar
-        filters = {'completed_at__date': day}
-        if queryset_filter:
-            filters.update(queryset_filter)
-            
-        tasks_that_day = UserTask.objects.filter(**filters).select_related('task')
-        
-        # Calcular sumas
-        day_points = sum(t.task.points for t in tasks_that_day)
-        # Estimación CO2: 0.05kg por punto (ajustable según tu lógica)
-        day_co2 = sum(t.task.points * 0.05 for t in tasks_that_day)
-        
+        row = totals.get(day, {})
         chart_data.append({
             "name": days_map[day.weekday()], # Ej: "Lun"
             "full_date": day.strftime("%d/%m"),
-            "points": day_points,
-            "co2": round(day_co2, 2),
-            "tasks": tasks_that_day.count() # Útil para admin
+            "points": row.get('points', 0),
+            "co2": round(row.get('co2', 0), 2),
+            "tasks": row.get('tasks', 0) # Útil para admin
         })
         
     return chart_data
 
+# --- UTILIDAD: EXPORTACIÓN DE USUARIOS EN STREAMING (NDJSON / CSV) ---
+EXPORT_CHUNK = 2000  # Filas por lectura del cursor
+
+class Echo:
+    """Buffer mínimo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+async def aexport_lines(rows, header, line):
+    """Versión ASGI: cada tanda se lee y se formatea en el hilo de la BD; en memoria solo queda una tanda."""
+    if header: yield header
+    iterator = rows.iterator(chunk_size=EXPORT_CHUNK)  # Generador: la consulta no corre hasta pedir la primera tanda
+    next_chunk = sync_to_async(lambda: ''.join(map(line, itertools.islice(iterator, EXPORT_CHUNK))))
+    while chunk := await next_chunk():
+        yield chunk
+
+def stream_users_export(users, export):
+    fields = ('id', 'first_name', 'email', 'is_active', 'profile__level', 'date_joined')
+    rows = users.values_list(*fields)
+    if export == 'csv':
+        writer = csv.writer(Echo())
+        header, line = writer.writerow(('id', 'name', 'email', 'is_active', 'level', 'date_joined')), writer.writerow
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        header, content_type = None, 'application/x-ndjson'
+        line = lambda r: json.dumps({"id": r[0], "name": r[1], "email": r[2], "is_active": r[3], "level": r[4] or "-",
+                                     "date_joined": r[5].isoformat()}, ensure_ascii=False) + '\n'
+    if settings.ASYNC_API:
+        # Bajo ASGI Django consumiría un generador sync entero en memoria (sync_to_async(list)): se itera en async
+        lines = aexport_lines(rows, header, line)
+    else:
+        lines = itertools.chain([header] if header else [], map(line, rows.iterator(chunk_size=EXPORT_CHUNK)))
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    if export == 'csv':
+        response['Content-Disposition'] = 'attachment; filename="usuarios.csv"'
+    return response
+
 # --- AUTENTICACIÓN ---
 
+def find_user_by_email(email):
+    # LOWER(email) = ... usa el índice funcional api_user_email_lower_idx (email__iexact no)
+    return User.objects.alias(email_lower=Lower('email')).filter(email_lower=email.strip().lower())
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny]) 
 @authentication_classes([]) 
+@throttle_classes([AuthIPThrottle])
 def register_user(request):
     data = request.data
     try:
         with transaction.atomic():
             email_clean = data['email'].lower().strip()
-            if User.objects.filter(email__iexact=email_clean).exists():
+            if find_user_by_email(email_clean).exists():
                 return Response({'error': 'El correo ya está registrado'}, status=400)
             
             user = User.objects.create_user(
                 username=email_clean, email=email_clean, password=data['password'], first_name=data.get('name', '').strip()
             )
-            Profile.objects.create(user=user, points=0, level="Eco-Iniciado")
-            
-            if Task.objects.count() == 0:
-                defaults = [
-                    {"title": "Reciclar Botellas", "points": 10, "description": "Fácil", "icon_type": "plastic"},
-                    {"title": "Usar Bolsa Reutilizable", "points": 5, "description": "Fácil", "icon_type": "bag"},
-                ]
-                for t in defaults: Task.objects.create(**t)
+            Profile.objects.create(user=user, points=0, level=get_levels().name(0))
+            # Las tareas base las asegura `manage.py seed_data` al desplegar, no cada registro
 
-            EmailThread('¡Bienvenido a EcoPoints! 🌿', f'Hola {user.first_name},\n\nTu cuenta ha sido creada exitosamente.', [user.email]).start()
+            queue_email('¡Bienvenido a EcoPoints! 🌿', f'Hola {user.first_name},\n\nTu cuenta ha sido creada exitosamente.', [user.email])
 
         return Response({'success': True, 'message': 'Usuario creado exitosamente'})
     except Exception as e:
@@ -99,13 +136,14 @@ def register_user(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([]) 
+@throttle_classes([AuthIPThrottle, AuthEmailThrottle])
 def login_user(request):
     data = request.data
     email = data.get('email', '').strip().lower()
     password = data.get('password', '')
     
     try:
-        user_obj = User.objects.get(email__iexact=email)
+        user_obj = find_user_by_email(email).get()
         user = authenticate(username=user_obj.username, password=password)
     except User.DoesNotExist:
         user = None
@@ -130,10 +168,11 @@ def login_user(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([]) 
+@throttle_classes([AuthIPThrottle, AuthEmailThrottle])
 def recover_password(request):
     email = request.data.get('email', '').strip().lower()
     try:
-        user = User.objects.get(email__iexact=email)
+        user = find_user_by_email(email).get()
         alphabet = string.ascii_letters + string.digits
         temp_pass = ''.join(secrets.choice(alphabet) for i in range(8))
         user.set_password(temp_pass)
@@ -141,7 +180,8 @@ def recover_password(request):
         if hasattr(user, 'profile'):
             user.profile.must_change_password = True
             user.profile.save()
-        EmailThread('Recuperación de Contraseña', f'Hola {user.first_name},\n\nTu contraseña temporal es: {temp_pass}', [user.email]).start()
+        invalidate_cached_user(user.id)
+        queue_email('Recuperación de Contraseña', f'Hola {user.first_name},\n\nTu contraseña temporal es: {temp_pass}', [user.email])
     except: pass
     return Response({'success': True, 'message': 'Si el correo existe, se enviaron instrucciones.'})
 
@@ -152,42 +192,176 @@ def recover_password(request):
 def complete_standard_task(request):
     user = request.user
     task_id = request.data.get('task_id')
+    # Reintentos del cliente con la misma clave no vuelven a sumar puntos
+    key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+    if key is not None and (not isinstance(key, str) or len(key) > 64): return Response({'error': 'Clave de idempotencia inválida'}, 400)
+    # Antiabuso antes de cualquier escritura: límites de la tarea desde el catálogo cacheado y ventanas en caché
+    try: row = catalog_index().get(int(task_id))
+    except (TypeError, ValueError): row = None
+    taken = None  # Cupo ocupado en las ventanas: se devuelve si al final no se escribe la completación
+    if row:
+        error = check_completion(user.id, row)
+        # Un reintento de una completación ya registrada no se rechaza: se responde lo mismo que la primera vez
+        if error and not (key and UserTask.objects.filter(user=user, idempotency_key=key).exists()):
+            return Response({'error': error}, 429)
+        if not error: taken = row
     try:
         task = Task.objects.get(id=task_id)
-        UserTask.objects.create(user=user, task=task)
-        profile = user.profile
-        profile.points += task.points
-        profile.co2_saved += (task.points * 0.05)
-        profile.save()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    UserTask.objects.create(user=user, task=task, idempotency_key=key)
+            except IntegrityError:
+                # Ya procesada: se responden los puntos actuales sin acreditar de nuevo
+                points = Profile.objects.filter(user=user).values_list('points', flat=True).get()
+                return Response({'success': True, 'message': f'¡Has ganado {task.points} puntos!', 'new_points': points})
+            record_completion(user.id, task.points)
+            # Suma atómica en la BD (sin leer-modificar-escribir en Python)
+            profile = user.profile
+            profile.points = F('points') + task.points
+            profile.co2_saved = F('co2_saved') + task.points * CO2_PER_POINT
+            profile.save(update_fields=['points', 'co2_saved'])
+            profile.refresh_from_db(fields=['points', 'co2_saved'])
+            sync_level(profile, task.points)
+            transaction.on_commit(lambda: sync_user(user, profile.points))
+            transaction.on_commit(lambda: invalidate_cached_user(user.id))
+            transaction.on_commit(lambda: bump_dashboard_version(user.id))
+        taken = None
         return Response({'success': True, 'message': f'¡Has ganado {task.points} puntos!', 'new_points': profile.points})
     except Task.DoesNotExist: return Response({'error': 'Tarea no encontrada'}, 404)
     except Exception as e: return Response({'error': str(e)}, 400)
+    finally:
+        if taken: release_completion(user.id, taken)
+
+# Máximo de ítems (suma de cantidades) por lote
+MAX_BATCH_ITEMS = 100
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_task_batch(request):
+    """Registra varias tareas de una vez (p. ej. en un punto limpio): una sola transacción y un solo UPDATE del perfil."""
+    user = request.user
+    items = request.data.get('items')
+    key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+    # Cada fila del lote guarda "<clave>:<n>", que debe caber en los 64 caracteres de la columna
+    if key is not None and (not isinstance(key, str) or len(key) > 60): return Response({'error': 'Clave de idempotencia inválida'}, 400)
+    try:
+        quantities = {}
+        for item in items:
+            task_id, quantity = int(item['task_id']), int(item.get('quantity', 1))
+            if quantity < 1: raise ValueError
+            quantities[task_id] = quantities.get(task_id, 0) + quantity
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return Response({'error': 'Formato inválido: items debe ser una lista de {task_id, quantity}'}, 400)
+    count = sum(quantities.values())
+    if not count or count > MAX_BATCH_ITEMS: return Response({'error': f'El lote debe tener entre 1 y {MAX_BATCH_ITEMS} ítems'}, 400)
+    # Cuentas sin perfil (staff, createsuperuser) no acumulan puntos: 400 como en la completación individual
+    try: profile = user.profile
+    except Profile.DoesNotExist: return Response({'error': 'El usuario no tiene perfil'}, 400)
+    catalog = catalog_index()
+    taken = []  # (fila, cantidad) con cupo ocupado en las ventanas: se devuelven si al final no se escribe el lote
+    try:
+        for tid, quantity in quantities.items():
+            if tid not in catalog: continue
+            error = check_completion(user.id, catalog[tid], quantity)
+            if error and not (key and UserTask.objects.filter(user=user, idempotency_key=f'{key}:0').exists()):
+                return Response({'error': error, 'task_id': tid}, 429)
+            if not error: taken.append((catalog[tid], quantity))
+
+        tasks = Task.objects.in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(tasks))
+        if missing: return Response({'error': 'Tarea no encontrada', 'task_ids': missing}, 404)
+
+        total = sum(tasks[tid].points * q for tid, q in quantities.items())
+        rows = [UserTask(user=user, task=tasks[tid]) for tid, q in quantities.items() for _ in range(q)]
+        if key:
+            for n, row in enumerate(rows): row.idempotency_key = f'{key}:{n}'
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    UserTask.objects.bulk_create(rows)
+            except IntegrityError:
+                # Lote ya procesado: se responden los totales actuales sin acreditar de nuevo
+                profile.refresh_from_db(fields=['points', 'co2_saved'])
+                return Response({'success': True, 'completed': count, 'earned': total,
+                                 'new_points': profile.points, 'co2_saved': profile.co2_saved})
+            record_completion(user.id, total, tasks=count)
+            profile.points = F('points') + total
+            profile.co2_saved = F('co2_saved') + total * CO2_PER_POINT
+            profile.save(update_fields=['points', 'co2_saved'])
+            profile.refresh_from_db(fields=['points', 'co2_saved'])
+            sync_level(profile, total)
+            transaction.on_commit(lambda: sync_user(user, profile.points))
+            transaction.on_commit(lambda: invalidate_cached_user(user.id))
+            transaction.on_commit(lambda: bump_dashboard_version(user.id))
+        taken = []
+    finally:
+        for row, quantity in taken: release_completion(user.id, row, quantity)
+    return Response({'success': True, 'message': f'¡Has ganado {total} puntos!', 'completed': count, 'earned': total,
+                     'new_points': profile.points, 'co2_saved': profile.co2_saved})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_history(request):
-    history = UserTask.objects.filter(user=request.user).select_related('task').order_by('-completed_at')[:10]
-    data = [{"title": h.task.title, "points": h.task.points, "date": h.completed_at.strftime("%d/%m %H:%M")} for h in history]
-    return Response(data)
+    if request.query_params:
+        try: history, limit = history_query(request.user, request.query_params)
+        except ValueError: return Response({'error': 'Parámetros inválidos'}, 400)
+        data, next_cursor = history_page(list(history[:limit + 1]), limit)
+    else:
+        # Primera página sin filtros (campanita del Header): sale del dashboard cacheado
+        data, next_cursor = get_dashboard(request.user, build_dashboard)['history']
+    response = Response(data)
+    if next_cursor: response['X-Next-Cursor'] = next_cursor
+    return response
+
+def history_query(user, params):
+    """Consulta (solo columnas necesarias) de una página del historial; ValueError si los parámetros no son válidos."""
+    # Keyset sobre el índice (user, -completed_at, -id): cada página cuesta O(tamaño de página)
+    history = UserTask.objects.filter(user=user).order_by('-completed_at', '-id')
+    limit = page_size(params.get('limit'), default=10, maximum=100)
+    # Fechas locales [from, to] convertidas a un rango semiabierto de datetimes
+    if params.get('from'):
+        day = parse_day(params['from'])
+        history = history.filter(completed_at__gte=local_day_bounds(day, day)[0])
+    if params.get('to'):
+        day = parse_day(params['to'])
+        history = history.filter(completed_at__lt=local_day_bounds(day, day)[1])
+    if params.get('cursor'):
+        last_at, last_id = decode_cursor(params['cursor'])
+        history = history.filter(Q(completed_at__lt=last_at) | Q(completed_at=last_at, id__lt=last_id))
+    return history.values('id', 'task__title', 'task__points', 'completed_at'), limit
+
+def history_page(rows, limit):
+    """Formatea limit + 1 filas: devuelve (datos, cursor de la página siguiente o None)."""
+    data = [{"title": h['task__title'], "points": h['task__points'],
+             "date": timezone.localtime(h['completed_at']).strftime("%d/%m %H:%M")} for h in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1]['completed_at'], rows[limit - 1]['id'])
+    return data, next_cursor
 
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
     user = request.user 
     if request.method == 'GET':
-        serializer = UserSerializer(user)
-        return Response(serializer.data)
+        # Proyección directa del User+Profile ya cargado por la autenticación (mismo JSON que UserSerializer)
+        return Response(user_payload(user))
     elif request.method == 'PUT':
         serializer = UserUpdateSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            # request.user puede venir de la caché de autenticación (copia de otro worker, hasta 30s vieja):
+            # nunca se guarda esa instancia, solo UPDATE de las columnas editadas
+            fields = dict(serializer.validated_data)
             new_pass = request.data.get('new_password')
-            if new_pass:
-                user.set_password(new_pass)
-                if hasattr(user, 'profile'):
-                    user.profile.must_change_password = False
-                    user.profile.save()
-                user.save()
+            if new_pass: fields['password'] = make_password(new_pass)
+            with transaction.atomic():
+                if fields: User.objects.filter(id=user.id).update(**fields)
+                if new_pass: Profile.objects.filter(user_id=user.id).update(must_change_password=False)
+            fresh = User.objects.select_related('profile').get(id=user.id)
+            if hasattr(fresh, 'profile'): sync_user(fresh, fresh.profile.points)
+            invalidate_cached_user(user.id)
+            bump_dashboard_version(user.id)
             return Response({'success': True, 'message': 'Perfil actualizado'})
         return Response(serializer.errors, 400)
 
@@ -195,39 +369,78 @@ def user_profile(request):
 @permission_classes([IsAuthenticated])
 def get_dashboard_data(request):
     try:
-        p = request.user.profile
-        progress = min(100, int((p.points % 1000) / 10))
-        
-        # --- NUEVO: LLAMADA A LA FUNCIÓN DE GRÁFICOS ---
-        # Filtramos solo por el usuario actual
-        weekly_data = get_weekly_chart_data(queryset_filter={'user': request.user})
-        
-        return Response({
-            "points": p.points, 
-            "level": p.level, 
-            "co2": round(p.co2_saved, 2), 
-            "progress": progress, 
-            "weekly_data": weekly_data # ¡Ahora enviamos datos reales!
-        })
+        # Filtramos solo por el usuario actual (cacheado hasta la próxima completación/edición o medianoche)
+        data = get_dashboard(request.user, build_dashboard)['dashboard']
+        if data is None: return Response({"points": 0, "weekly_data": []}, 400)  # Cuenta sin perfil (p. ej. createsuperuser)
+        return Response(data)
     except Exception as e:
         print(f"Error dashboard: {e}")
         return Response({"points": 0, "weekly_data": []}, 400)
 
+def build_dashboard(user):
+    """Payload del dashboard + primera página del historial, tal como se guarda en caché."""
+    # El perfil se relee de la BD: el User+Profile de la autenticación puede venir de caché.
+    # Las cuentas sin perfil (staff creado a mano) no tienen dashboard, pero sí historial.
+    profile = Profile.objects.filter(user_id=user.id).first()
+    history, limit = history_query(user, {})
+    return {"dashboard": dashboard_payload(profile, get_weekly_chart_data(user=user)) if profile else None,
+            "history": history_page(list(history[:limit + 1]), limit)}
+
+def dashboard_payload(p, weekly_data, levels=None):
+    progress = (levels or get_levels()).progress(p.points)
+    return {
+        "points": p.points, 
+        "level": p.level, 
+        "co2": round(p.co2_saved, 2), 
+        "progress": progress, 
+        "weekly_data": weekly_data # ¡Ahora enviamos datos reales!
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_user_analytics(request):
+    # ?range=90&granularity=week&group_by=icon_type (o ?from=AAAA-MM-DD&to=AAAA-MM-DD), máximo un año
+    try: return Response(get_analytics(request.query_params, user_id=request.user.id))
+    except ValueError: return Response({'error': 'Parámetros inválidos'}, 400)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_tasks(request):
-    tasks = Task.objects.all()
-    serializer = TaskSerializer(tasks, many=True)
-    return Response(serializer.data)
+    # Catálogo versionado en caché: sin BD ni serializer mientras no cambien las tareas
+    version = catalog_version()
+    etag = catalog_etag(version)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers=headers)
+    return Response(get_catalog(version), headers=headers)
 
 @api_view(['GET'])
 @permission_classes([AllowAny]) 
 @authentication_classes([]) 
 def get_ranking(request):
-    profiles = Profile.objects.filter(user__is_superuser=False, user__is_staff=False).select_related('user').order_by('-points')[:10]
-    data = [{"name": p.user.first_name, "points": p.points} for p in profiles]
+    # Top 10 servido desde el backend de ranking (sin ordenar la tabla de perfiles)
+    data = [{"name": e["name"], "points": e["points"]} for e in get_leaderboard().top(0, 10)]
     return Response(data)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def get_ranking_page(request):
+    try:
+        offset = max(0, int(request.query_params.get('offset', 0)))
+        limit = min(100, max(1, int(request.query_params.get('limit', 20))))
+    except ValueError: return Response({'error': 'Parámetros inválidos'}, 400)
+    board = get_leaderboard()
+    data = [{"rank": e["rank"], "name": e["name"], "points": e["points"]} for e in board.top(offset, limit)]
+    return Response({"results": data, "total": board.count()})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_my_rank(request):
+    board = get_leaderboard()
+    points = request.user.profile.points if hasattr(request.user, 'profile') else 0
+    return Response({"rank": board.rank(request.user.id), "points": points, "total": board.count()})
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_custom_task(request):
@@ -239,12 +452,31 @@ def create_custom_task(request):
 @permission_classes([IsAuthenticated, IsAdminUser])
 def admin_manage_users(request, user_id=None):
     if request.method == 'GET':
-        users = User.objects.all().select_related('profile').order_by('-date_joined')
-        data = []
-        for u in users:
-            level = u.profile.level if hasattr(u, 'profile') else "-"
-            data.append({"id": u.id, "name": u.first_name, "email": u.email, "is_active": u.is_active, "level": level})
-        return Response(data)
+        users = User.objects.order_by('-date_joined', '-id')
+        q = request.query_params.get('q', '').strip()
+        if q: users = users.filter(Q(first_name__icontains=q) | Q(email__icontains=q))
+
+        # Exportación completa en streaming: memoria constante sin importar el número de usuarios
+        export = request.query_params.get('export')
+        if export in ('ndjson', 'csv'):
+            return stream_users_export(users, export)
+
+        try:
+            limit = page_size(request.query_params.get('limit'))
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                joined, uid = decode_cursor(cursor)
+                users = users.filter(Q(date_joined__lt=joined) | Q(date_joined=joined, id__lt=uid))
+        except ValueError: return Response({'error': 'Parámetros inválidos'}, 400)
+
+        rows = list(users.values('id', 'first_name', 'email', 'is_active', 'profile__level', 'date_joined')[:limit + 1])
+        data = [{"id": u['id'], "name": u['first_name'], "email": u['email'], "is_active": u['is_active'],
+                 "level": u['profile__level'] or "-"} for u in rows[:limit]]
+        response = Response(data)
+        # El cursor de la página siguiente viaja en cabecera para no cambiar la forma del JSON
+        if len(rows) > limit:
+            response['X-Next-Cursor'] = encode_cursor(rows[limit - 1]['date_joined'], rows[limit - 1]['id'])
+        return response
     elif request.method == 'PUT':
         uid = request.data.get('user_id')
         try:
@@ -252,16 +484,59 @@ def admin_manage_users(request, user_id=None):
             if u == request.user: return Response({'error': 'No puedes bloquearte a ti mismo'}, 400)
             u.is_active = not u.is_active
             u.save()
+            # Sin esto un usuario suspendido seguiría autenticado hasta que expire la caché
+            invalidate_cached_user(u.id)
+            bump_dashboard_version(u.id)
             return Response({'success': True, 'message': 'Estado cambiado'})
         except: return Response({'error': 'Usuario no encontrado'}, 404)
     elif request.method == 'DELETE':
         try:
             u = User.objects.get(id=user_id)
             if u.is_superuser: return Response({'error': 'No puedes borrar superadmin'}, 400)
-            u.delete()
+            with transaction.atomic():
+                discount_user(u.id)
+                u.delete()
+            get_leaderboard().remove(user_id)
+            invalidate_cached_user(user_id)
+            bump_dashboard_version(user_id)
             return Response({'success': True, 'message': 'Usuario eliminado'})
         except: return Response({'error': 'Error al eliminar'}, 400)
 
+# Máximo de usuarios por acción masiva
+MAX_BULK_USERS = 1000
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def admin_bulk_users(request):
+    """POST {user_ids, is_active?}: (des)activa con un solo UPDATE (sin is_active, invierte el estado de cada uno).
+    DELETE {user_ids}: encola el borrado como trabajo en segundo plano y responde 202 con su id."""
+    try:
+        ids = sorted({int(uid) for uid in request.data.get('user_ids')})
+    except (TypeError, ValueError):
+        return Response({'error': 'Formato inválido: user_ids debe ser una lista de ids'}, 400)
+    if not ids or len(ids) > MAX_BULK_USERS: return Response({'error': f'Se permiten entre 1 y {MAX_BULK_USERS} usuarios'}, 400)
+
+    if request.method == 'DELETE':
+        job = queue_delete_users(ids, requested_by=request.user)
+        return Response({'success': True, 'job': job_payload(job)}, 202)
+
+    is_active = request.data.get('is_active')
+    if is_active is not None and not isinstance(is_active, bool): return Response({'error': 'is_active debe ser booleano'}, 400)
+    # Igual que el PUT individual: nadie se bloquea a sí mismo (ni a un superadmin)
+    users = User.objects.filter(id__in=ids, is_superuser=False).exclude(id=request.user.id)
+    affected = list(users.values_list('id', flat=True))
+    new_state = Value(is_active) if is_active is not None else Case(When(is_active=True, then=Value(False)), default=Value(True))
+    updated = users.update(is_active=new_state)
+    invalidate_cached_users(affected)
+    bump_dashboard_versions(affected)
+    return Response({'success': True, 'updated': updated})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def admin_job_detail(request, job_id):
+    try: return Response(job_payload(AdminJob.objects.get(id=job_id)))
+    except AdminJob.DoesNotExist: return Response({'error': 'No encontrado'}, 404)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def admin_create_task(request):
@@ -288,16 +563,38 @@ def admin_task_detail(request, task_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def admin_dashboard_stats(request):
-    # 1. Totales Generales
-    tp = Profile.objects.aggregate(Sum('points'))['points__sum'] or 0
-    tc = Profile.objects.aggregate(Sum('co2_saved'))['co2_saved__sum'] or 0
+    # 1. Totales Generales y por año/mes: filas precalculadas (GlobalStat), sin recorrer los perfiles
+    stats = {s['period']: s for s in GlobalStat.objects.values('period', 'points', 'co2', 'tasks')}
+    total = stats.pop('all', {'points': 0, 'co2': 0.0})
+    periods = [{"period": k, "points": v['points'], "co2": round(v['co2'], 2), "tasks": v['tasks']}
+               for k, v in sorted(stats.items())]
     
     # 2. Datos del Gráfico (Usando la función compartida que creamos)
-    # Al pasar queryset_filter=None, trae los datos de TODOS los usuarios (Global)
-    chart_data = get_weekly_chart_data(queryset_filter=None)
+    # Sin usuario, trae los datos de TODOS los usuarios (rollup global)
+    chart_data = get_weekly_chart_data()
     
     return Response({
-        "total_points": tp, 
-        "total_co2": round(tc, 2), 
-        "chart_data": chart_data # <--- Esto ahora contiene [{name, points, co2}, ...]
-    })
\ No newline at end of file
+        "total_points": total['points'], 
+        "total_co2": round(total['co2'], 2), 
+        "chart_data": chart_data, # <--- Esto ahora contiene [{name, points, co2}, ...]
+        "yearly": [p for p in periods if len(p['period']) == 4],
+        "monthly": [p for p in periods if len(p['period']) == 7][-12:],  # Últimos 12 meses con actividad
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def admin_analytics(request):
+    # Mismos parámetros que /api/analytics/, sobre todos los usuarios
+    try: return Response(get_analytics(request.query_params))
+    except ValueError: return Response({'error': 'Parámetros inválidos'}, 400)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def admin_metrics(request):
+    # Métricas del proceso que atiende la petición (cada worker tiene su propia ventana)
+    if not settings.API_METRICS_ENABLED:
+        return Response({"enabled": False, "views": {}})
+    if request.method == 'DELETE':
+        metrics.reset()
+        return Response({'success': True})
+    return Response({"enabled": True, "views": metrics.snapshot()})
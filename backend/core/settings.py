@@ -1,6 +1,8 @@
 import os
+import sys
 from pathlib import Path
 import dj_database_url # Nueva librería para leer la BD de Railway
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -27,6 +29,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.QueryMetricsMiddleware', # Métricas por vista (se desactiva con API_METRICS=0)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Para archivos estáticos en prod (opcional pero recomendado)
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -39,6 +42,8 @@ MIDDLEWARE = [
 
 # Configuración CORS y CSRF para producción
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'ETag']
 CSRF_TRUSTED_ORIGINS = [
     'https://*.railway.app',
     'https://*.netlify.app',
@@ -70,12 +75,62 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-        conn_max_age=600
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        conn_health_checks=True,  # Descarta conexiones persistentes muertas (reinicio/failover de la BD) antes de usarlas
     )
 }
 
+_db = DATABASES['default']
+if _db['ENGINE'] == 'django.db.backends.postgresql':
+    _options = _db.setdefault('OPTIONS', {})
+    _options.setdefault('connect_timeout', int(os.environ.get('DB_CONNECT_TIMEOUT', 5)))
+    if os.environ.get('DB_PGBOUNCER') == '1':
+        # PgBouncer en modo transacción: sin cursores del lado del servidor ni parámetros de sesión al conectar
+        # (los timeouts se fijan en el rol: ALTER ROLE ... SET statement_timeout = '30s')
+        _db['DISABLE_SERVER_SIDE_CURSORS'] = True
+    else:
+        # Corta consultas desbocadas y transacciones olvidadas abiertas (ms; 0 = sin límite). Por defecto solo en los
+        # procesos web (gunicorn/uvicorn, runserver): migrate y los comandos de mantenimiento (rebuild_rollups,
+        # reconcile_stats, archive_completions, workers) recorren UserTask entera en una sola sentencia y no se cortan.
+        # Las variables de entorno fijan el valor para todos los procesos.
+        _web = Path(sys.argv[0]).name != 'manage.py' or sys.argv[1:2] == ['runserver']
+        _options['options'] = (f"-c statement_timeout={os.environ.get('DB_STATEMENT_TIMEOUT', 30000 if _web else 0)} "
+                               f"-c idle_in_transaction_session_timeout={os.environ.get('DB_IDLE_TX_TIMEOUT', 60000 if _web else 0)}")
+    if os.environ.get('DB_POOL') == '1':
+        # Pool nativo de Django (psycopg 3 + psycopg_pool): conexiones abiertas al arrancar cada worker y, con
+        # CONN_HEALTH_CHECKS, verificadas al prestarse. Es incompatible con CONN_MAX_AGE (el pool ya las reutiliza).
+        _db['CONN_MAX_AGE'] = 0
+        _options['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),  # Workers sync: 1 conexión en uso a la vez
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_idle': 300,
+        }
+elif _db['ENGINE'] == 'django.db.backends.sqlite3':
+    # Local: WAL (lecturas sin bloquear escrituras) y BEGIN IMMEDIATE (evita "database is locked" al pasar de leer a escribir)
+    _db['OPTIONS'] = {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; '
+                        'PRAGMA mmap_size=134217728; PRAGMA cache_size=-20000;',
+    }
+
 AUTH_PASSWORD_VALIDATORS = []
 
+# HASH DE CONTRASEÑAS: scrypt (o argon2 con PASSWORD_HASHER=argon2, requiere argon2-cffi) con costo ajustable.
+# Los hashes PBKDF2 existentes se siguen validando y se actualizan solos en el siguiente login.
+PASSWORD_HASHERS = [
+    'api.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if os.environ.get('PASSWORD_HASHER') == 'argon2':
+    PASSWORD_HASHERS.insert(0, 'api.hashers.TunedArgon2PasswordHasher')
+SCRYPT_WORK_FACTOR = 2 ** int(os.environ.get('SCRYPT_LOG2_N', 14))
+SCRYPT_PARALLELISM = int(os.environ.get('SCRYPT_PARALLELISM', 1))
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 65536))  # KiB
+
 LANGUAGE_CODE = 'es-cl'
 TIME_ZONE = 'America/Santiago'
 USE_I18N = True
@@ -93,13 +148,35 @@ EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Segundos máximos por operación SMTP: un servidor colgado no bloquea al worker de correos indefinidamente
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 30))
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'api.authentication.CachedJWTAuthentication', # JWT + User/Profile en una consulta, cacheado
+    ),
+    # Proxies de confianza delante de la app (el de Railway/Render agrega la IP real al final de X-Forwarded-For).
+    # El throttle por IP toma esa entrada; con 0 se usa REMOTE_ADDR. Sin esto DRF confía en la cabecera del cliente.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0 if DEBUG else 1)),
 }
 
+# JSON con orjson (FAST_JSON=1, requiere orjson): mismos bytes que el JSONRenderer de DRF, menos CPU por respuesta
+FAST_JSON = os.environ.get('FAST_JSON') == '1'
+if FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+
+# Límite de intentos en login/registro/recuperación (por IP y por correo). AUTH_THROTTLE=0 lo desactiva.
+AUTH_THROTTLE_RATES = {
+    'auth_ip': os.environ.get('AUTH_THROTTLE_IP', '30/min'),
+    'auth_email': os.environ.get('AUTH_THROTTLE_EMAIL', '10/min'),
+} if os.environ.get('AUTH_THROTTLE', '1') == '1' else {}
+
+# Segundos que se reutiliza el User+Profile cargado por la autenticación JWT
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 30))
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -108,4 +185,52 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
-}
\ No newline at end of file
+}
+
+# CACHÉ: Redis compartido si existe REDIS_URL (Railway la define al adjuntar Redis; cliente redis en requirements.txt),
+# si no memoria local del proceso
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Segundos que vive el catálogo de tareas cacheado (y su versión/ETag)
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Segundos que vive el dashboard cacheado por usuario (además expira a medianoche). Con caché local
+# por worker la invalidación no llega a los demás procesos: por eso el valor por defecto es corto sin Redis.
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 600 if REDIS_URL else 30))
+
+# Segundos que vive una serie de /api/analytics/ o /api/admin/analytics/ cacheada (por parámetros)
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 300))
+
+# Días durante los que un reintento con Idempotency-Key no se acredita dos veces: la clave se busca en UserTask,
+# y archive_completions se niega a archivar completaciones más recientes que esto
+IDEMPOTENCY_RETRY_DAYS = int(os.environ.get('IDEMPOTENCY_RETRY_DAYS', 30))
+
+# RANKING: backend en memoria por defecto; con REDIS_URL se puede usar un sorted set compartido
+LEADERBOARD_BACKEND = os.environ.get('LEADERBOARD_BACKEND', 'api.leaderboard.InMemoryLeaderboard')
+LEADERBOARD_REDIS_URL = REDIS_URL or 'redis://localhost:6379/0'
+LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 60))
+
+# ANTIABUSO: enfriamiento y tope diario por tarea (Task.cooldown_seconds / daily_limit), contados antes de escribir
+# en la BD. Con Redis las ventanas se comparten entre workers; sin él, ventanas exactas en memoria de cada proceso.
+COMPLETION_LIMITS_ENABLED = os.environ.get('COMPLETION_LIMITS', '1') == '1'
+COMPLETION_LIMITER_BACKEND = os.environ.get('COMPLETION_LIMITER_BACKEND', 'api.limits.CacheSlidingWindow' if REDIS_URL
+                                            else 'api.limits.InMemorySlidingWindow')
+
+# NIVELES: cada worker recarga la tabla de umbrales cada N segundos (los cambios en el admin ya recalculan perfiles)
+LEVELS_REFRESH_SECONDS = int(os.environ.get('LEVELS_REFRESH_SECONDS', 300))
+
+# MÉTRICAS: tiempo/consultas por vista, cabecera Server-Timing y /api/admin/metrics/
+API_METRICS_ENABLED = os.environ.get('API_METRICS', '1' if DEBUG else '0') == '1'
+API_METRICS_WINDOW = int(os.environ.get('API_METRICS_WINDOW', 1000))  # Muestras por vista
+API_METRICS_REPEAT_THRESHOLD = 3  # Consultas idénticas en una petición para marcar un N+1
+
+# ASGI: vistas async para dashboard/tareas/ranking/historial (gunicorn -k uvicorn.workers.UvicornWorker core.asgi)
+ASYNC_API = os.environ.get('ASYNC_API') == '1'
+if ASYNC_API:
+    # WhiteNoise no es async: obligaría a cada petición a pasar por un hilo. Los estáticos
+    # (solo el admin de Django) los sirve core/asgi.py en este modo.
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from api import views
+from api import views, async_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -15,16 +16,33 @@ urlpatterns = [
     path('api/dashboard/', views.get_dashboard_data),
     path('api/tasks/', views.get_tasks),
     path('api/ranking/', views.get_ranking),
+    path('api/ranking/top/', views.get_ranking_page),
+    path('api/ranking/me/', views.get_my_rank),
+    path('api/analytics/', views.get_user_analytics),
     path('api/custom-task/', views.create_custom_task),
     
     # --- NUEVOS ENDPOINTS ---
     path('api/task/complete/', views.complete_standard_task), 
+    path('api/task/complete/batch/', views.complete_task_batch),
     path('api/history/', views.get_user_history),   
               
     # Admin
     path('api/admin/users/', views.admin_manage_users),
     path('api/admin/users/<int:user_id>/', views.admin_manage_users),
+    path('api/admin/users/bulk/', views.admin_bulk_users),
+    path('api/admin/jobs/<int:job_id>/', views.admin_job_detail),
     path('api/admin/tasks/create/', views.admin_create_task),
     path('api/admin/tasks/<int:task_id>/', views.admin_task_detail),
     path('api/admin/dashboard/', views.admin_dashboard_stats),
-]
\ No newline at end of file
+    path('api/admin/analytics/', views.admin_analytics),
+    path('api/admin/metrics/', views.admin_metrics),
+]
+
+# Con ASYNC_API=1 (despliegue ASGI) los endpoints de lectura más usados se sirven con vistas async
+if settings.ASYNC_API:
+    urlpatterns = [
+        path('api/dashboard/', async_views.get_dashboard_data),
+        path('api/tasks/', async_views.get_tasks),
+        path('api/ranking/', async_views.get_ranking),
+        path('api/history/', async_views.get_user_history),
+    ] + urlpatterns
@@ -6,10 +6,19 @@ import { CheckCircle, XCircle, Trash2 } from 'lucide-react';
 
 const AdminUsers = () => {
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const { showToast } = useToast();
 
+  // El backend pagina por cursor: la página siguiente viene en la cabecera X-Next-Cursor
+  const loadUsers = (cursor = null) => {
+    api.get('/api/admin/users/', { params: cursor ? { cursor } : {} }).then(res => {
+      setUsers(prev => cursor ? [...prev, ...res.data] : res.data);
+      setNextCursor(res.headers['x-next-cursor'] || null);
+    });
+  };
+
   useEffect(() => {
-    api.get('/api/admin/users/').then(res => setUsers(res.data));
+    loadUsers();
   }, []);
 
   const toggleUser = async (id) => {
@@ -76,6 +85,11 @@ const AdminUsers = () => {
                     ))}
                 </tbody>
             </table>
+            {nextCursor && (
+                <button onClick={() => loadUsers(nextCursor)} className="btn" style={{width:'100%', padding:'12px'}}>
+                    Cargar más
+                </button>
+            )}
         </div>
       </div>
     </>